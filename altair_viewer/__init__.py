@@ -4,17 +4,29 @@ __version__ = "0.5.0.dev0"
 __all__ = [
     "ChartViewer",
     "NoMatchingVersions",
+    "OpenTelemetryTracer",
+    "Tracer",
     "display",
     "render",
     "show",
+    "add_script_directory",
+    "download_script",
     "get_bundled_script",
+    "resolve_bundled_version",
 ]
 
-from altair_viewer._viewer import ChartViewer
-from altair_viewer._scripts import get_bundled_script
+from altair_viewer._viewer import ChartViewer, _prewarm_from_environment
+from altair_viewer._scripts import (
+    add_script_directory,
+    download_script,
+    get_bundled_script,
+    resolve_bundled_version,
+)
+from altair_viewer._tracing import OpenTelemetryTracer, Tracer
 from altair_viewer._utils import NoMatchingVersions
 
 _global_viewer = ChartViewer()
 display = _global_viewer.display
 render = _global_viewer.render
 show = _global_viewer.show
+_prewarm_from_environment(_global_viewer)
@@ -0,0 +1,83 @@
+from collections import OrderedDict
+import hashlib
+import json
+import threading
+from typing import Any, Dict, Optional
+
+from altair_viewer._utils import Version
+
+
+def compiler_available() -> bool:
+    """Return True if a local Vega-Lite compiler (vl-convert) is installed."""
+    try:
+        import vl_convert  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class CompileCache:
+    """LRU cache of Vega specifications compiled from Vega-Lite with vl-convert.
+
+    Parameters
+    ----------
+    maxsize : int
+        The maximum number of compiled specifications to keep.
+    """
+
+    maxsize: int
+    _cache: "OrderedDict[str, Dict[str, Any]]"
+    _lock: threading.Lock
+
+    def __init__(self, maxsize: int = 32) -> None:
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def compile(
+        self,
+        spec: Dict[str, Any],
+        vegalite_version: Optional[str] = None,
+        config: Optional[dict] = None,
+        theme: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Compile a Vega-Lite specification to Vega.
+
+        Returns None if vl-convert is not installed, does not support the requested
+        Vega-Lite version, or fails to compile the specification; the chart should
+        then be compiled by the browser as usual.
+        """
+        try:
+            import vl_convert
+        except ImportError:
+            return None
+        vl_version = None
+        if vegalite_version is not None:
+            version = Version(vegalite_version)
+            vl_version = f"{version.major}.{version.minor or 0}"
+            if vl_version not in vl_convert.get_vegalite_versions():
+                return None
+        key = hashlib.sha256(
+            json.dumps([spec, vl_version, config, theme], sort_keys=True).encode()
+        ).hexdigest()
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        try:
+            compiled = vl_convert.vegalite_to_vega(
+                spec,
+                vl_version=vl_version,
+                config=config,
+                theme=theme,  # type: ignore[arg-type]
+            )
+        except ValueError:
+            return None
+        with self._lock:
+            self._cache[key] = compiled
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return compiled
@@ -0,0 +1,91 @@
+import json
+from typing import Any, Callable, Collection, Dict, Optional
+
+Store = Callable[[str], Optional[str]]
+
+
+def _rewrite(obj: Any, urls: Dict[str, str], store: Store) -> Any:
+    if isinstance(obj, list):
+        return [_rewrite(item, urls, store) for item in obj]
+    if not isinstance(obj, dict):
+        return obj
+    result = {}
+    for key, value in obj.items():
+        if key == "values":
+            # Inline data, which needs no rewriting.
+            result[key] = value
+            continue
+        if key == "data" and isinstance(value, dict):
+            value = _external_data(value, urls, store)
+        result[key] = _rewrite(value, urls, store)
+    return result
+
+
+def _external_data(
+    data: Dict[str, Any], urls: Dict[str, str], store: Store
+) -> Dict[str, Any]:
+    """Return a data definition referencing externalized data by URL.
+
+    Inline values keep their ``name``, which names the data source itself, while
+    a reference to an externalized top-level dataset is replaced by its URL.
+    """
+    if isinstance(data.get("values"), list):
+        url = store(json.dumps(data["values"], separators=(",", ":")))
+        drop = "values"
+    elif data.get("name") in urls:
+        url = urls[data["name"]]
+        drop = "name"
+    else:
+        url = None
+    if url is None:
+        return data
+    data = {k: v for k, v in data.items() if k != drop}
+    data["url"] = url
+    return data
+
+
+def externalize_data(
+    spec: Dict[str, Any],
+    threshold: int,
+    store: Callable[[str], str],
+    keep: Collection[str] = (),
+) -> Dict[str, Any]:
+    """Move large inline data in a Vega-Lite specification out of the spec.
+
+    Inline ``values`` and top-level ``datasets`` whose JSON serialization is larger
+    than ``threshold`` bytes are passed to ``store``, which returns a URL serving
+    them as JSON. References to the data are replaced with the URL. Top-level
+    datasets named in ``keep`` stay inline. The input specification is not
+    modified.
+
+    Examples
+    --------
+    >>> spec = {"data": {"values": [1, 2, 3]}, "mark": "point"}
+    >>> externalize_data(spec, 5, lambda content: "data.json")
+    {'data': {'url': 'data.json'}, 'mark': 'point'}
+    >>> externalize_data(spec, 100, lambda content: "data.json") == spec
+    True
+    """
+
+    def store_large(content: str) -> Optional[str]:
+        return store(content) if len(content) > threshold else None
+
+    urls: Dict[str, str] = {}
+    datasets = spec.get("datasets")
+    if isinstance(datasets, dict):
+        datasets = dict(datasets)
+        for name, values in spec["datasets"].items():
+            if name in keep:
+                continue
+            url = store_large(json.dumps(values, separators=(",", ":")))
+            if url is not None:
+                urls[name] = url
+                del datasets[name]
+    result = _rewrite(
+        {key: value for key, value in spec.items() if key != "datasets"},
+        urls,
+        store_large,
+    )
+    if datasets:
+        result["datasets"] = datasets
+    return result
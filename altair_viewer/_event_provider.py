@@ -1,73 +1,379 @@
-from collections import defaultdict
+import asyncio
+from collections import deque
+import datetime
+import itertools
+import json
+import re
+import struct
 import threading
 import time
-from typing import Any, MutableMapping, Set, TypeVar
+from typing import Any, Callable, Deque, Dict, FrozenSet, Iterator, MutableMapping
+from typing import NamedTuple, Optional, Set, Tuple, TypeVar
+import zlib
 
 import tornado.gen
+import tornado.httpserver
+import tornado.ioloop
+import tornado.locks
+import tornado.netutil
 import tornado.web
 import tornado.websocket
 
 from altair_data_server._provide import Provider
+from altair_viewer._history import History
+from altair_viewer._resources import resource_nbytes
+from altair_viewer._tracing import Tracer
+
+
+def encode_event(data: str) -> bytes:
+    r"""Encode data as a server-sent event.
+
+    Each line of the data gets its own ``data:`` field, as required by the
+    event stream format.
+
+    Examples
+    --------
+    >>> encode_event("abc")
+    b'data: abc\n\n'
+    >>> encode_event("a\nb")
+    b'data: a\ndata: b\n\n'
+    """
+    lines = re.split(r"\r\n|\r|\n", data)
+    return "".join(f"data: {line}\n" for line in lines).encode() + b"\n"
+
+
+def deflate_block(data: bytes, level: int) -> bytes:
+    """Compress data to self-contained, non-final deflate blocks.
+
+    The blocks do not reference earlier data and end on a byte boundary, so
+    blocks compressed independently can be concatenated into one deflate stream.
+    This lets each event be compressed once and shared by every gzip connection.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+class GzipStream:
+    """Per-connection state of a gzip stream built from shared deflate blocks."""
+
+    # Header: magic, deflate method, no flags, no mtime, no extra flags, unknown OS.
+    HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+
+    def __init__(self) -> None:
+        self._started = False
+        self._crc = 0
+        self._size = 0
+
+    def encode(self, data: bytes, deflated: bytes) -> bytes:
+        """Return the bytes to write for data, given its deflated blocks."""
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        if not self._started:
+            self._started = True
+            return self.HEADER + deflated
+        return deflated
+
+    def trailer(self) -> bytes:
+        """Return the bytes which end the stream."""
+        # An empty final block, then the CRC-32 and size of the uncompressed data.
+        end = b"\x03\x00" + struct.pack("<II", self._crc, self._size & 0xFFFFFFFF)
+        return end if self._started else self.HEADER + end
+
+
+# An SSE comment line, ignored by clients.
+HEARTBEAT = b":\n\n"
+HEARTBEAT_DEFLATED = deflate_block(HEARTBEAT, 0)
+
+
+class Frame(NamedTuple):
+    """An encoded event, shared by all connections to a stream."""
+
+    version: int
+    data: str
+    encoded: bytes
+    deflated: Optional[bytes]
+    # Attributes of the event's spans, if the provider has a tracer.
+    trace: Optional[Dict[str, Any]] = None
 
 
 class DataSource:
-    """Data source for an event stream."""
+    """Data source for an event stream.
+
+    :meth:`send` may be called from any thread, and by several threads at once.
+    The event is encoded on the calling thread, then handed to the IOLoop with
+    ``IOLoop.add_callback``, which publishes it to the stream's latest-value slot
+    and wakes its connections. Each send is numbered as it starts, and an event
+    is only published if it is newer than the current one, so the stream always
+    ends with the event of the last send to start, and clients never receive
+    events out of order. History records the published events, in the same order.
+
+    If the provider has a tracer, each send records a ``publish`` span, from the
+    start of the send until the event is published on the IOLoop.
+    """
+
+    _frame: Frame
+    _sent: Frame
+    _sent_lock: threading.Lock
+    _versions: Iterator[int]
+    _changed: tornado.locks.Condition
+    history: Optional[History]
 
     def __init__(
-        self, provider: "EventProvider", stream_id: str, data: str = ""
+        self,
+        provider: "EventProvider",
+        stream_id: str,
+        data: str = "",
+        history: Optional[History] = None,
     ) -> None:
         self._provider = provider
         self.stream_id = stream_id
-        self.data = data
+        self._frame = self._sent = self._make_frame(1 if data else 0, data)
+        self._sent_lock = threading.Lock()
+        # next() on itertools.count is atomic, so concurrent sends get unique,
+        # increasing versions.
+        self._versions = itertools.count(self._frame.version + 1)
+        self._changed = tornado.locks.Condition()
+        self.history = history
+        if data and history is not None:
+            history.append(data)
+
+    @property
+    def data(self) -> str:
+        """The latest data sent to the stream.
+
+        A thread reading this after a send sees the data it sent, or newer data,
+        even before the IOLoop has published it.
+        """
+        return max(self._frame, self._sent, key=lambda frame: frame.version).data
+
+    def send(self, data: str, attributes: Optional[Dict[str, Any]] = None) -> None:
+        """Send data to the event stream. Safe to call from any thread.
+
+        The event is encoded once, and the same buffer is written to every
+        connected client. Data equal to the latest data is not sent again. If the
+        provider has a tracer, ``attributes`` are added to the ``publish`` and
+        ``write`` spans of the event.
+        """
+        if data == self.data:
+            return
+        tracer = self._provider._tracer
+        start_ns = time.time_ns() if tracer is not None else 0
+        frame = self._make_frame(next(self._versions), data)
+        if tracer is not None:
+            frame = frame._replace(
+                trace=dict(
+                    attributes or {},
+                    stream=self.stream_id,
+                    version=frame.version,
+                    bytes=len(frame.encoded),
+                )
+            )
+        with self._sent_lock:
+            # A concurrent send which started later may have finished first.
+            if frame.version > self._sent.version:
+                self._sent = frame
+        ioloop = self._provider._ioloop
+        try:
+            if ioloop is not None:
+                ioloop.add_callback(self._publish, frame, start_ns)
+                return
+        except RuntimeError:
+            pass  # The IOLoop was closed.
+        self._publish(frame, start_ns)
 
-    def send(self, data: str) -> None:
-        """Send data to the event stream."""
-        self.data = data
+    def _publish(self, frame: Frame, start_ns: int = 0) -> None:
+        """Publish an event to connections, on the IOLoop thread."""
+        if frame.version > self._frame.version:
+            self._frame = frame
+            if self.history is not None:
+                self.history.append(frame.data)
+            self._changed.notify_all()
+        tracer = self._provider._tracer
+        if tracer is not None and frame.trace is not None:
+            tracer.span("publish", start_ns, time.time_ns(), frame.trace)
+
+    async def wait(self, timeout: float) -> None:
+        """Wait up to timeout seconds for a new event, on the IOLoop thread."""
+        await self._changed.wait(datetime.timedelta(seconds=timeout))
+
+    def _make_frame(self, version: int, data: str) -> Frame:
+        encoded = encode_event(data)
+        deflated = None
+        level = self._provider._compression_level
+        if level is not None:
+            if len(encoded) < self._provider._compression_min_size:
+                level = 0
+            deflated = deflate_block(encoded, level)
+        return Frame(version, data, encoded, deflated)
 
     @property
     def url(self) -> str:
         return f"{self._provider.url}/{self._provider._stream_path}/{self.stream_id}"
 
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes held by the stream, including its history."""
+        frame = self._frame
+        nbytes = len(frame.data) + len(frame.encoded) + len(frame.deflated or b"")
+        if self.history is not None:
+            nbytes += self.history.nbytes
+        return nbytes
+
 
 class ConnectionMonitor(tornado.websocket.WebSocketHandler):
-    """Web socket connection to monitor connections."""
+    """Web socket connection to monitor connections.
+
+    Clients are pinged every ``ping_interval`` seconds, and connections which
+    do not respond within ``ping_timeout`` seconds are closed, so that
+    ``connections`` only holds live clients. It is modified while holding
+    ``connections_lock``, so that other threads can take consistent snapshots.
+
+    Clients report the keys of the content they have cached with messages of the
+    form ``{"cached": [key, ...]}``, which are recorded in ``cached``. Other fields
+    of messages are passed to the handler for the field in ``message_handlers``,
+    on the IOLoop thread. On connection, clients are sent a ``{key: value}``
+    message for each item of ``client_messages``.
+    """
 
+    cached: FrozenSet[str]
     _connections: Set["ConnectionMonitor"]
+    _connections_lock: threading.Lock
+    _message_handlers: Dict[str, Callable[[Any], None]]
+    _client_messages: Dict[str, Any]
     _disconnect_event: threading.Event
+    _ping_interval: Optional[float]
+    _ping_timeout: Optional[float]
+    _compression_level: Optional[int]
 
     def initialize(
-        self, connections: Set["ConnectionMonitor"], disconnect_event: threading.Event
+        self,
+        connections: Set["ConnectionMonitor"],
+        disconnect_event: threading.Event,
+        ping_interval: Optional[float] = None,
+        ping_timeout: Optional[float] = None,
+        compression_level: Optional[int] = None,
+        message_handlers: Optional[Dict[str, Callable[[Any], None]]] = None,
+        client_messages: Optional[Dict[str, Any]] = None,
+        connections_lock: Optional[threading.Lock] = None,
     ) -> None:
         self._connections = connections
+        self._connections_lock = connections_lock or threading.Lock()
         self._disconnect_event = disconnect_event
+        self._ping_interval = ping_interval
+        self._ping_timeout = ping_timeout
+        self._compression_level = compression_level
+        self._message_handlers = message_handlers or {}
+        self._client_messages = client_messages or {}
+        self.cached = frozenset()
+
+    def get_compression_options(self) -> Optional[Dict[str, Any]]:
+        if self._compression_level is None:
+            return None
+        return {"compression_level": self._compression_level}
+
+    @property
+    def ping_interval(self) -> Optional[float]:
+        return self._ping_interval
+
+    @property
+    def ping_timeout(self) -> Optional[float]:
+        return self._ping_timeout
 
     def open(self, *args: str, **kwargs: str) -> None:
-        self._connections.add(self)
+        with self._connections_lock:
+            self._connections.add(self)
+            messages = list(self._client_messages.items())
         self._disconnect_event.clear()
+        for key, value in messages:
+            self.write_message(json.dumps({key: value}))
+
+    def on_message(self, message: Any) -> None:
+        try:
+            msg = json.loads(message)
+        except ValueError:
+            return
+        if not isinstance(msg, dict):
+            return
+        if isinstance(msg.get("cached"), list):
+            self.cached = frozenset(str(key) for key in msg["cached"])
+        for key, value in msg.items():
+            handler = self._message_handlers.get(key)
+            if handler is not None:
+                handler(value)
 
     def on_close(self) -> None:
-        self._connections.remove(self)
-        if not self._connections:
+        with self._connections_lock:
+            self._connections.discard(self)
+            disconnected = not self._connections
+        if disconnected:
             self._disconnect_event.set()
 
 
 class EventStreamHandler(tornado.web.RequestHandler):
-    """Request handler for an event stream."""
+    """Request handler for an event stream.
+
+    Each connection tracks the bytes it has written but not yet flushed. A new
+    event is only written while this is at most ``high_water_mark`` bytes; until
+    then, intermediate events are skipped and the latest one is sent once the
+    client catches up. Connections with a write pending for longer than
+    ``write_timeout`` seconds are closed.
+
+    Idle connections are sent an SSE comment every ``heartbeat_interval``
+    seconds, so that dead clients are detected and their handlers released.
+
+    If ``compress`` is True and the client accepts it, the response is
+    gzip-encoded, with each event flushed as soon as it is written.
+
+    Events are written in chunks of at most ``chunk_size`` bytes, yielding to the
+    IOLoop between chunks, so that a large event does not hold up other
+    connections and requests while it is written.
+
+    If ``tracer`` is specified, a ``write`` span is recorded for each event, from
+    when it is queued for this connection until its last byte is flushed.
+    """
 
     _data_sources: MutableMapping[str, DataSource]
     _stop_event: threading.Event
-    _current_value: MutableMapping[str, str]
+    _high_water_mark: int
+    _write_timeout: Optional[float]
+    _heartbeat_interval: Optional[float]
+    _chunk_size: int
+    _gzip: Optional[GzipStream]
+    _tracer: Optional[Tracer]
+    # Total bytes queued and flushed, and the traced events not yet flushed, as
+    # (total bytes queued when the event was queued, start time, attributes).
+    _queued: int
+    _flushed_bytes: int
+    _writes: Deque[Tuple[int, int, Dict[str, Any]]]
 
     def initialize(
         self,
         data_sources: MutableMapping[str, DataSource],
         stop_event: threading.Event,
+        high_water_mark: int = 0,
+        write_timeout: Optional[float] = None,
+        heartbeat_interval: Optional[float] = None,
+        compress: bool = False,
+        chunk_size: int = 65536,
+        tracer: Optional[Tracer] = None,
     ) -> None:
         self._data_sources = data_sources
         self._stop_event = stop_event
-        self._current_value = defaultdict(str)
+        self._high_water_mark = high_water_mark
+        self._write_timeout = write_timeout
+        self._heartbeat_interval = heartbeat_interval
+        self._chunk_size = chunk_size
+        self._gzip = None
+        self._tracer = tracer
+        self._queued = self._flushed_bytes = 0
+        self._writes = deque()
         self.set_header("content-type", "text/event-stream")
         self.set_header("cache-control", "no-cache")
+        if compress:
+            self.set_header("vary", "Accept-Encoding")
+            if "gzip" in self.request.headers.get("Accept-Encoding", ""):
+                self._gzip = GzipStream()
+                self.set_header("content-encoding", "gzip")
 
     async def get(self):
         path = self.request.path
@@ -75,41 +381,279 @@ class EventStreamHandler(tornado.web.RequestHandler):
         if stream_id not in self._data_sources:
             self.set_response(404)
             return
+        source = self._data_sources[stream_id]
+        version = 0
+        # Data waiting to be written, and bytes queued or written but not flushed.
+        outbox: Deque[memoryview] = deque()
+        buffered = 0
+        # The flush in progress, with its size in bytes and start time. Tornado only
+        # tracks the most recent flush, so one chunk at a time is written.
+        flushing: Optional[Tuple["asyncio.Future[None]", int, float]] = None
+        last_write = time.monotonic()
         try:
             while not self._stop_event.is_set():
-                if self._data_sources[stream_id].data != self._current_value[stream_id]:
-                    value = self._data_sources[stream_id].data
-                    self._current_value[stream_id] = value
-                    self.write(f"data: {value}\n\n")
-                    await self.flush()
+                now = time.monotonic()
+                if flushing is not None and self._flushed(flushing, now):
+                    buffered -= flushing[1]
+                    flushing = None
+                frame = source._frame
+                if frame.version != version and buffered <= self._high_water_mark:
+                    version = frame.version
+                    data = self._encode(frame.encoded, frame.deflated)
+                    buffered += self._enqueue(outbox, data, frame.trace)
+                elif not buffered and self._heartbeat_due(last_write, now):
+                    data = self._encode(HEARTBEAT, HEARTBEAT_DEFLATED)
+                    buffered += self._enqueue(outbox, data)
+                if flushing is None and outbox:
+                    flushing = self._write_chunk(outbox, now)
+                    last_write = now
+                    # Let other connections and requests run between chunks.
+                    await asyncio.sleep(0)
+                elif flushing is not None:
+                    # Wake when the write completes, or to check the timeout.
+                    await asyncio.wait([flushing[0]], timeout=0.05)
                 else:
-                    await tornado.gen.sleep(0.05)
+                    await source.wait(0.05)
+            self._write_trailer()
         except tornado.iostream.StreamClosedError:
             pass
 
+    def _write_trailer(self) -> None:
+        """Write the end of the response encoding, if any."""
+        if self._gzip is not None:
+            self.write(self._gzip.trailer())
+
+    def _flushed(
+        self, flushing: Tuple["asyncio.Future[None]", int, float], now: float
+    ) -> bool:
+        """Return True if a flush has completed.
+
+        Closes the connection if the flush has exceeded the write timeout.
+        """
+        future, size, start = flushing
+        if future.done():
+            future.result()
+            self._flushed_bytes += size
+            if self._writes:
+                self._trace_writes()
+            return True
+        if self._write_timeout is not None and now - start > self._write_timeout:
+            self.request.connection.close()  # type: ignore[union-attr]
+            raise tornado.iostream.StreamClosedError()
+        return False
+
+    def _enqueue(
+        self,
+        outbox: Deque[memoryview],
+        data: bytes,
+        trace: Optional[Dict[str, Any]] = None,
+    ) -> int:
+        """Queue data to write, returning its size in bytes."""
+        outbox.append(memoryview(data))
+        self._queued += len(data)
+        if self._tracer is not None and trace is not None:
+            self._writes.append((self._queued, time.time_ns(), trace))
+        return len(data)
+
+    def _trace_writes(self) -> None:
+        """Record spans for traced events which have been flushed."""
+        assert self._tracer is not None
+        end_ns = time.time_ns()
+        while self._writes and self._writes[0][0] <= self._flushed_bytes:
+            _, start_ns, trace = self._writes.popleft()
+            attributes = dict(trace, client=self.request.remote_ip)
+            self._tracer.span("write", start_ns, end_ns, attributes)
+
+    def _heartbeat_due(self, last_write: float, now: float) -> bool:
+        return (
+            self._heartbeat_interval is not None
+            and now - last_write > self._heartbeat_interval
+        )
+
+    def _write_chunk(
+        self, outbox: Deque[memoryview], now: float
+    ) -> Tuple["asyncio.Future[None]", int, float]:
+        """Write and flush the next chunk of the outbox."""
+        chunk = outbox[0][: self._chunk_size]
+        if len(chunk) < len(outbox[0]):
+            outbox[0] = outbox[0][len(chunk) :]
+        else:
+            outbox.popleft()
+        self.write(chunk.tobytes())
+        return self.flush(), len(chunk), now
+
+    def _encode(self, data: bytes, deflated: Optional[bytes]) -> bytes:
+        """Return the bytes to write to this connection for an event."""
+        if self._gzip is None:
+            return data
+        if deflated is None:
+            raise RuntimeError("Internal: event was not compressed.")
+        return self._gzip.encode(data, deflated)
+
+
+class HistoryHandler(tornado.web.RequestHandler):
+    """Request handler for stream histories.
+
+    ``{history_path}/{stream_id}`` lists the entries in the history of a stream,
+    and ``{history_path}/{stream_id}/{entry_id}`` returns the data of an entry.
+    """
+
+    _data_sources: MutableMapping[str, DataSource]
+
+    def initialize(self, data_sources: MutableMapping[str, DataSource]) -> None:
+        self._data_sources = data_sources
+        self.set_header("content-type", "application/json")
+
+    def get(self, stream_id: str, entry_id: Optional[str] = None) -> None:
+        source = self._data_sources.get(stream_id)
+        if source is None or source.history is None:
+            raise tornado.web.HTTPError(404)
+        if entry_id is None:
+            self.write(json.dumps(source.history.entries()))
+            return
+        try:
+            self.write(source.history.get(int(entry_id)))
+        except KeyError:
+            raise tornado.web.HTTPError(404)
+
 
 T = TypeVar("T", bound="EventProvider")
 
 
 class EventProvider(Provider):
-    """A resource provider with event streams."""
+    """A resource provider with event streams.
+
+    Parameters
+    ----------
+    stream_path : str
+        The URL path under which event streams are served.
+    websocket_path : str
+        The URL path of the connection-monitoring websocket.
+    history_path : str
+        The URL path under which stream histories are served.
+    high_water_mark : int
+        The maximum number of unflushed bytes per stream connection before new
+        events are held back. Intermediate events for a lagging client are
+        skipped, and it receives the latest event once it catches up. The default
+        of 0 allows only one event to be in flight per connection.
+    write_timeout : float or None
+        Close stream connections that have not flushed a write within this many
+        seconds. If None, never time out. Default is 60.
+    heartbeat_interval : float or None
+        Send a keepalive comment on idle stream connections every this many
+        seconds. If None, do not send heartbeats. Default is 15.
+    ping_interval : float or None
+        Ping monitoring websocket connections every this many seconds. If None,
+        do not send pings. Default is 10.
+    ping_timeout : float or None
+        Close monitoring websocket connections that do not answer a ping within
+        this many seconds. If None, use tornado's default.
+    compression_level : int or None
+        If specified, gzip event streams for clients which accept it, and enable
+        websocket compression, at this zlib compression level (1-9). Each event is
+        compressed once, however many clients are connected. If None (default),
+        do not compress.
+    compression_min_size : int
+        Events smaller than this many bytes are sent uncompressed. Default is 1024.
+    write_chunk_size : int
+        Events are written to each stream connection in chunks of at most this many
+        bytes, taking turns with other connections and requests between chunks.
+        Default is 65536.
+    tracer : Tracer or None
+        If specified, record ``publish`` and ``write`` spans of stream events with
+        this tracer. If None (default), do not trace.
+    """
 
     _data_sources: MutableMapping[str, DataSource]
     _stream_path: str
     _websocket_path: str
+    _history_path: str
+    _high_water_mark: int
+    _write_timeout: Optional[float]
+    _heartbeat_interval: Optional[float]
+    _ping_interval: Optional[float]
+    _ping_timeout: Optional[float]
+    _compression_level: Optional[int]
+    _compression_min_size: int
+    _write_chunk_size: int
+    _tracer: Optional[Tracer]
+    _server_thread: Optional[threading.Thread]
     _stop_event: threading.Event
     _connections: Set[ConnectionMonitor]
+    _connections_lock: threading.Lock
     _disconnect_event: threading.Event
+    _message_handlers: Dict[str, Callable[[Any], None]]
+    _client_messages: Dict[str, Any]
 
-    def __init__(self, stream_path: str = "stream", websocket_path: str = "websocket"):
+    def __init__(
+        self,
+        stream_path: str = "stream",
+        websocket_path: str = "websocket",
+        history_path: str = "history",
+        high_water_mark: int = 0,
+        write_timeout: Optional[float] = 60.0,
+        heartbeat_interval: Optional[float] = 15.0,
+        ping_interval: Optional[float] = 10.0,
+        ping_timeout: Optional[float] = None,
+        compression_level: Optional[int] = None,
+        compression_min_size: int = 1024,
+        write_chunk_size: int = 65536,
+        tracer: Optional[Tracer] = None,
+    ):
         self._data_sources = {}
         self._stream_path = stream_path
         self._websocket_path = websocket_path
+        self._history_path = history_path
+        self._high_water_mark = high_water_mark
+        self._write_timeout = write_timeout
+        self._heartbeat_interval = heartbeat_interval
+        self._ping_interval = ping_interval
+        self._ping_timeout = ping_timeout
+        self._compression_level = compression_level
+        self._compression_min_size = compression_min_size
+        self._write_chunk_size = write_chunk_size
+        self._tracer = tracer
         self._stop_event = threading.Event()
         self._connections = set()
+        self._connections_lock = threading.Lock()
         self._disconnect_event = threading.Event()
+        self._message_handlers = {}
+        self._client_messages = {}
         super().__init__()
 
+    def start(
+        self: T, port: Optional[int] = None, timeout: int = 1, daemon: bool = True
+    ) -> T:
+        """Start the server in a background thread, if it is not running.
+
+        Unlike ``Provider.start``, which listens from the server thread and waits
+        forever if that fails, the port is bound before the thread starts, so an
+        OSError is raised if it is in use. If ``port`` is None, a free port is used.
+        """
+        if self._server_thread is not None:
+            return self
+        sockets = tornado.netutil.bind_sockets(port or 0, address="")
+        self._port = sockets[0].getsockname()[1]
+        started = threading.Event()
+        self._stopped = threading.Event()
+        self._ioloop = ioloop = tornado.ioloop.IOLoop()
+        self._server = server = tornado.httpserver.HTTPServer(
+            self.wsgi_app, idle_connection_timeout=timeout, body_timeout=timeout
+        )
+        stopped = self._stopped
+
+        def serve() -> None:
+            ioloop.make_current()
+            server.add_sockets(sockets)
+            ioloop.add_callback(started.set)
+            ioloop.start()
+            stopped.set()
+
+        thread = self._server_thread = threading.Thread(target=serve, daemon=daemon)
+        thread.start()
+        started.wait()
+        return self
+
     def stop(self: T) -> T:
         self._stop_event.set()
         time.sleep(0.05)  # Allow loop in thread to complete.
@@ -118,10 +662,24 @@ class EventProvider(Provider):
     def _handlers(self) -> Any:
         handlers = super()._handlers()
         return [
+            (
+                rf"/{self._history_path}/([^/]+)(?:/(\d+))?",
+                HistoryHandler,
+                dict(data_sources=self._data_sources),
+            ),
             (
                 f"/{self._stream_path}/.*",
                 EventStreamHandler,
-                dict(data_sources=self._data_sources, stop_event=self._stop_event),
+                dict(
+                    data_sources=self._data_sources,
+                    stop_event=self._stop_event,
+                    high_water_mark=self._high_water_mark,
+                    write_timeout=self._write_timeout,
+                    heartbeat_interval=self._heartbeat_interval,
+                    compress=self._compression_level is not None,
+                    chunk_size=self._write_chunk_size,
+                    tracer=self._tracer,
+                ),
             ),
             (
                 f"/{self._websocket_path}",
@@ -129,12 +687,81 @@ class EventProvider(Provider):
                 dict(
                     connections=self._connections,
                     disconnect_event=self._disconnect_event,
+                    ping_interval=self._ping_interval,
+                    ping_timeout=self._ping_timeout,
+                    compression_level=self._compression_level,
+                    message_handlers=self._message_handlers,
+                    client_messages=self._client_messages,
+                    connections_lock=self._connections_lock,
                 ),
             ),
         ] + handlers
 
-    def create_stream(self, stream_id: str) -> DataSource:
+    def memory_usage(self) -> Dict[str, int]:
+        """Return the number of bytes held by each stream and resource.
+
+        Keys are the URL paths at which streams and resources are served.
+        """
+        usage = {
+            f"{self._stream_path}/{stream_id}": source.nbytes
+            for stream_id, source in list(self._data_sources.items())
+        }
+        for route, resource in list(self._resources.items()):
+            usage[route] = resource_nbytes(resource)
+        return usage
+
+    @property
+    def connections(self) -> FrozenSet[ConnectionMonitor]:
+        """The connected websocket clients. Safe to read from any thread."""
+        with self._connections_lock:
+            return frozenset(self._connections)
+
+    def add_message_handler(self, key: str, handler: Callable[[Any], None]) -> None:
+        """Handle the ``key`` field of messages from websocket clients.
+
+        ``handler`` is called with the value of the field on the IOLoop thread, so
+        it should hand off any slow work to another thread.
+        """
+        self._message_handlers[key] = handler
+
+    def send_message(self, key: str, value: Any) -> None:
+        """Send ``{key: value}`` to websocket clients.
+
+        The message is sent to all connected clients, and to clients which connect
+        later, until it is replaced by another message with the same key. Safe to
+        call from any thread.
+        """
+        with self._connections_lock:
+            self._client_messages[key] = value
+        ioloop = self._ioloop
+        if ioloop is not None:
+            ioloop.add_callback(self._broadcast, json.dumps({key: value}))
+
+    def _broadcast(self, message: str) -> None:
+        for conn in self.connections:
+            try:
+                conn.write_message(message)
+            except tornado.websocket.WebSocketClosedError:
+                pass
+
+    def cached_by_clients(self, key: str) -> bool:
+        """Return True if clients are connected, and all of them have cached key."""
+        connections = self.connections
+        return bool(connections) and all(key in conn.cached for conn in connections)
+
+    def create_stream(
+        self, stream_id: str, history: Optional[History] = None
+    ) -> DataSource:
+        """Create an event stream, or return the existing stream with this id.
+
+        Parameters
+        ----------
+        stream_id : str
+            The id of the stream.
+        history : History (optional)
+            If specified, record data sent to a newly created stream in this history.
+        """
         if stream_id not in self._data_sources:
-            self._data_sources[stream_id] = DataSource(self, stream_id)
+            self._data_sources[stream_id] = DataSource(self, stream_id, history=history)
             self.start()
         return self._data_sources[stream_id]
@@ -0,0 +1,150 @@
+from collections import OrderedDict
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+import zlib
+
+COMPRESSION_LEVEL = 6
+
+
+def _parse_payload(data: str) -> Optional[Dict[str, Any]]:
+    """Parse viewer data with a spec containing inline datasets, if possible."""
+    try:
+        payload = json.loads(data)
+    except ValueError:
+        return None
+    if (
+        isinstance(payload, dict)
+        and isinstance(payload.get("spec"), dict)
+        and isinstance(payload["spec"].get("datasets"), dict)
+        and payload["spec"]["datasets"]
+    ):
+        return payload
+    return None
+
+
+class HistoryEntry(NamedTuple):
+    """A compressed entry in a stream history."""
+
+    id: int
+    timestamp: float
+    size: int
+    blob: bytes
+    datasets: Dict[str, str]
+
+
+class History:
+    """Memory-bounded history of the data sent to an event stream.
+
+    Entries are stored zlib-compressed. Inline datasets in a Vega-Lite spec's
+    top-level ``datasets`` are stored separately and shared between entries, so
+    that re-displaying the same data costs nothing. When either limit is exceeded,
+    the least recently used entries are evicted.
+
+    Parameters
+    ----------
+    max_entries : int
+        The maximum number of entries to keep.
+    max_bytes : int
+        The maximum number of compressed bytes to keep, including datasets.
+    """
+
+    max_entries: int
+    max_bytes: int
+    _entries: "OrderedDict[int, HistoryEntry]"
+    _datasets: Dict[str, bytes]
+    _refcounts: Dict[str, int]
+    _nbytes: int
+    _next_id: int
+    _last_data: str
+    _lock: threading.Lock
+
+    def __init__(self, max_entries: int = 50, max_bytes: int = 50_000_000) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._datasets = {}
+        self._refcounts = {}
+        self._nbytes = 0
+        self._next_id = 0
+        self._last_data = ""
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        """The number of compressed bytes held by the history."""
+        return self._nbytes
+
+    def append(self, data: str) -> None:
+        """Add data to the history, unless it repeats the most recent entry."""
+        with self._lock:
+            if data == self._last_data:
+                return
+            self._last_data = data
+            datasets: Dict[str, str] = {}
+            payload = _parse_payload(data)
+            if payload is not None:
+                spec = payload["spec"] = dict(payload["spec"])
+                for name, values in spec.pop("datasets").items():
+                    datasets[name] = self._add_dataset(values)
+                content = json.dumps(payload).encode()
+            else:
+                content = data.encode()
+            blob = zlib.compress(content, COMPRESSION_LEVEL)
+            entry = HistoryEntry(self._next_id, time.time(), len(data), blob, datasets)
+            self._next_id += 1
+            self._entries[entry.id] = entry
+            self._nbytes += len(blob)
+            self._evict()
+
+    def _add_dataset(self, values: Any) -> str:
+        content = json.dumps(values, separators=(",", ":")).encode()
+        key = hashlib.sha256(content).hexdigest()
+        if key not in self._datasets:
+            self._datasets[key] = zlib.compress(content, COMPRESSION_LEVEL)
+            self._refcounts[key] = 0
+            self._nbytes += len(self._datasets[key])
+        self._refcounts[key] += 1
+        return key
+
+    def _evict(self) -> None:
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self._nbytes > self.max_bytes
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self._nbytes -= len(entry.blob)
+            for key in entry.datasets.values():
+                self._refcounts[key] -= 1
+                if not self._refcounts[key]:
+                    self._nbytes -= len(self._datasets.pop(key))
+                    del self._refcounts[key]
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Return metadata for the entries in the history, oldest first."""
+        with self._lock:
+            return [
+                {"id": e.id, "timestamp": e.timestamp, "size": e.size}
+                for e in sorted(self._entries.values(), key=lambda e: e.id)
+            ]
+
+    def get(self, entry_id: int) -> str:
+        """Return the data of an entry.
+
+        Raises
+        ------
+        KeyError : if the entry is not in the history.
+        """
+        with self._lock:
+            entry = self._entries[entry_id]
+            self._entries.move_to_end(entry_id)
+            content = zlib.decompress(entry.blob).decode()
+            if not entry.datasets:
+                return content
+            payload = json.loads(content)
+            payload["spec"]["datasets"] = {
+                name: json.loads(zlib.decompress(self._datasets[key]))
+                for name, key in entry.datasets.items()
+            }
+            return json.dumps(payload)
@@ -0,0 +1,113 @@
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from altair_viewer._utils import is_vegalite
+
+logger = logging.getLogger(__name__)
+
+# Marks drawn as a single path per series, whatever the number of data rows.
+PATH_MARKS = {"area", "line", "trail", "geoshape"}
+
+COMPOSITION_KEYS = ("layer", "concat", "hconcat", "vconcat")
+
+
+def _mark_type(mark: Any) -> Optional[str]:
+    if isinstance(mark, dict):
+        return mark.get("type")
+    if isinstance(mark, str):
+        return mark
+    return None
+
+
+def _data_size(data: Any, datasets: Dict[str, Any]) -> Optional[int]:
+    """Number of inline rows in a data definition, or None if unknown."""
+    if not isinstance(data, dict):
+        return None
+    values = data.get("values")
+    if values is None and "name" in data:
+        values = datasets.get(data["name"])
+    return len(values) if isinstance(values, list) else None
+
+
+def _repeat_count(repeat: Any) -> int:
+    if isinstance(repeat, list):
+        return len(repeat)
+    if isinstance(repeat, dict):
+        count = 1
+        for fields in repeat.values():
+            if isinstance(fields, list):
+                count *= len(fields)
+        return count
+    return 1
+
+
+def _count(spec: Dict[str, Any], datasets: Dict[str, Any], rows: int) -> int:
+    size = _data_size(spec.get("data"), datasets)
+    if size is not None:
+        rows = size
+    if "mark" in spec:
+        mark = _mark_type(spec["mark"])
+        if mark is None:
+            return 0
+        return 1 if mark in PATH_MARKS else rows
+    count = 0
+    for key in COMPOSITION_KEYS:
+        for subspec in spec.get(key, []):
+            if isinstance(subspec, dict):
+                count += _count(subspec, datasets, rows)
+    if isinstance(spec.get("spec"), dict):
+        # Facets partition the data; repeats draw it once per repeated field.
+        count += _repeat_count(spec.get("repeat")) * _count(
+            spec["spec"], datasets, rows
+        )
+    return count
+
+
+def estimate_mark_count(spec: Dict[str, Any]) -> int:
+    """Estimate the number of marks drawn by a Vega-Lite specification.
+
+    Only inline data (``values``, or named top-level ``datasets``) is counted,
+    and transforms are ignored, so this is an upper bound for charts whose data
+    is entirely inline, and zero for charts which only load data from URLs.
+
+    Examples
+    --------
+    >>> estimate_mark_count({"data": {"values": [{}] * 3}, "mark": "point"})
+    3
+    >>> estimate_mark_count({"data": {"values": [{}] * 3}, "mark": "line"})
+    1
+    >>> estimate_mark_count({"data": {"url": "data.csv"}, "mark": "point"})
+    0
+    """
+    datasets = spec.get("datasets")
+    return _count(spec, datasets if isinstance(datasets, dict) else {}, 0)
+
+
+def choose_renderer(
+    spec: Dict[str, Any], embed_opt: Optional[dict], canvas_threshold: Optional[int]
+) -> Tuple[dict, Optional[int]]:
+    """Return embed options which select a renderer suited to the chart size.
+
+    Charts with more than ``canvas_threshold`` estimated marks are rendered to
+    canvas, which is much faster than SVG for large numbers of marks. A renderer
+    specified in ``embed_opt`` is always respected, as are Vega specifications.
+
+    Also returns the estimated number of marks, or None if it was not estimated.
+    """
+    embed_opt = dict(embed_opt or {})
+    if (
+        canvas_threshold is None
+        or "renderer" in embed_opt
+        or not is_vegalite(spec, embed_opt)
+    ):
+        return embed_opt, None
+    marks = estimate_mark_count(spec)
+    if marks > canvas_threshold:
+        embed_opt["renderer"] = "canvas"
+    logger.debug(
+        "Estimated %d marks (canvas threshold %d); using the %s renderer.",
+        marks,
+        canvas_threshold,
+        embed_opt.get("renderer", "default"),
+    )
+    return embed_opt, marks
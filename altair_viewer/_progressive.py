@@ -0,0 +1,54 @@
+from typing import Any, Dict, Iterator, List, Tuple
+
+# The number of rows in each chunk of progressively loaded data.
+CHUNK_ROWS = 100_000
+
+
+def stratified_sample(values: List[Any], size: int) -> Tuple[List[Any], List[Any]]:
+    """Split rows into a sample of size rows and the remaining rows.
+
+    The rows are divided into ``size`` strata of consecutive rows, and the first
+    row of each stratum is sampled, so that the sample spans the whole dataset.
+
+    Examples
+    --------
+    >>> stratified_sample(list(range(10)), 3)
+    ([0, 3, 6], [1, 2, 4, 5, 7, 8, 9])
+    """
+    n = len(values)
+    if n <= size:
+        return list(values), []
+    sampled = {i * n // size for i in range(size)}
+    sample = [values[i] for i in sorted(sampled)]
+    remaining = [row for i, row in enumerate(values) if i not in sampled]
+    return sample, remaining
+
+
+def split_datasets(
+    spec: Dict[str, Any], max_rows: int
+) -> Tuple[Dict[str, Any], Dict[str, List[Any]]]:
+    """Replace large top-level datasets of a Vega-Lite specification with samples.
+
+    Returns the new specification, and the rows left out of each sampled dataset.
+    The input specification is not modified.
+    """
+    datasets = spec.get("datasets")
+    if not isinstance(datasets, dict):
+        return spec, {}
+    sampled = dict(datasets)
+    remaining = {}
+    for name, values in datasets.items():
+        if isinstance(values, list) and len(values) > max_rows:
+            sampled[name], remaining[name] = stratified_sample(values, max_rows)
+    if not remaining:
+        return spec, {}
+    return dict(spec, datasets=sampled), remaining
+
+
+def chunks(
+    remaining: Dict[str, List[Any]], chunk_rows: int
+) -> Iterator[Tuple[str, List[Any]]]:
+    """Yield (dataset name, rows) chunks of the remaining rows of each dataset."""
+    for name, values in remaining.items():
+        for start in range(0, len(values), chunk_rows):
+            yield name, values[start : start + chunk_rows]
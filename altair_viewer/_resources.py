@@ -0,0 +1,101 @@
+from collections import OrderedDict
+import threading
+from typing import Dict, Hashable, Optional, Set
+
+from altair_data_server import Resource
+
+
+def resource_nbytes(resource: Resource) -> int:
+    """The number of bytes of content held by a resource."""
+    content = getattr(resource, "content", b"")
+    if isinstance(content, str):
+        content = content.encode()
+    return len(content)
+
+
+class ResourcePool:
+    """Reference-counted resources with a byte budget and LRU eviction.
+
+    The provider serving resources only holds weak references to them, so a
+    resource is served for as long as the pool holds it. Resources are owned by
+    the charts which use them: owned resources are never evicted, while resources
+    with no owners are evicted, least recently used first, while the pool holds
+    more than ``max_bytes`` bytes.
+
+    Parameters
+    ----------
+    max_bytes : int
+        The byte budget of the pool. If zero, resources are released as soon as
+        they have no owners.
+    """
+
+    max_bytes: int
+    _resources: "OrderedDict[str, Resource]"
+    _nbytes: Dict[str, int]
+    _owners: Dict[str, Set[Hashable]]
+    _owned: Dict[Hashable, Set[str]]
+    _lock: threading.RLock
+
+    def __init__(self, max_bytes: int = 100_000_000) -> None:
+        self.max_bytes = max_bytes
+        self._resources = OrderedDict()
+        self._nbytes = {}
+        self._owners = {}
+        self._owned = {}
+        self._lock = threading.RLock()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._resources
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes held by resources in the pool."""
+        return sum(self._nbytes.values())
+
+    def get(self, key: str, owner: Optional[Hashable] = None) -> Optional[Resource]:
+        """Return the resource with this key, or None if it is not in the pool.
+
+        If ``owner`` is specified, it takes a reference to the resource.
+        """
+        with self._lock:
+            resource = self._resources.get(key)
+            if resource is not None:
+                self._resources.move_to_end(key)
+                if owner is not None:
+                    self._owners[key].add(owner)
+                    self._owned.setdefault(owner, set()).add(key)
+            return resource
+
+    def add(
+        self, key: str, resource: Resource, owner: Optional[Hashable] = None
+    ) -> Resource:
+        """Add a resource to the pool, returning the pooled resource for key.
+
+        If ``owner`` is specified, it takes a reference to the resource.
+        """
+        with self._lock:
+            if key not in self._resources:
+                self._resources[key] = resource
+                self._nbytes[key] = resource_nbytes(resource)
+                self._owners[key] = set()
+            pooled = self.get(key, owner)
+            self._evict()
+            assert pooled is not None
+            return pooled
+
+    def release(self, owner: Hashable) -> None:
+        """Drop all references held by owner."""
+        with self._lock:
+            for key in self._owned.pop(owner, ()):
+                self._owners[key].discard(owner)
+            self._evict()
+
+    def _evict(self) -> None:
+        nbytes = self.nbytes
+        for key in list(self._resources):
+            if nbytes <= self.max_bytes:
+                break
+            if not self._owners[key]:
+                nbytes -= self._nbytes.pop(key)
+                del self._resources[key]
+                del self._owners[key]
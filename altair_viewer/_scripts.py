@@ -1,13 +1,81 @@
 import json
 import functools
+import hashlib
+import os
 import pkgutil
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+from urllib.request import urlopen
 
-from altair_viewer._utils import find_version
+from altair_viewer._utils import find_version, NoMatchingVersions, Version
+
+CDN_URL = "https://cdn.jsdelivr.net/npm/{package}@{version}"
+CDN_COMBINE_URL = "https://cdn.jsdelivr.net/combine/{packages}"
+VENDOR_PACKAGES = ("vega", "vega-lite", "vega-embed")
+MANIFEST = "manifest.json"
+
+
+def _default_script_directory() -> str:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "altair_viewer", "scripts")
+
+
+def _env_script_directories() -> List[str]:
+    """Return the script directories listed in ALTAIR_VIEWER_SCRIPT_PATH."""
+    paths = os.environ.get("ALTAIR_VIEWER_SCRIPT_PATH", "").split(os.pathsep)
+    return [os.path.abspath(path) for path in paths if path]
+
+
+# Local script stores searched after the bundled scripts, in order. The default
+# download directory is only searched once registered, so that the versions
+# resolved do not depend on scripts downloaded by earlier sessions.
+_script_directories: List[str] = _env_script_directories()
+
+
+def _clear_caches() -> None:
+    _script_listing.cache_clear()
+    _script_locations.cache_clear()
+    _version_index.cache_clear()
+
+
+def add_script_directory(path: str) -> None:
+    """Add a local directory of scripts to search for package versions.
+
+    The directory may either contain a ``manifest.json`` index of content-addressed
+    scripts, as written by :func:`download_script`, or use the same layout as the
+    bundled scripts: a ``listing.json`` file with ``{package}-{version}.js`` files.
+
+    Parameters
+    ----------
+    path : str
+        The path of the directory.
+    """
+    path = os.path.abspath(path)
+    if path not in _script_directories:
+        _script_directories.insert(0, path)
+    _clear_caches()
+
+
+def _read_directory(path: str) -> Dict[str, Dict[str, str]]:
+    """Return a mapping of package -> version -> filename for a script directory."""
+    manifest_path = os.path.join(path, MANIFEST)
+    listing_path = os.path.join(path, "listing.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            return json.load(f)
+    if os.path.exists(listing_path):
+        with open(listing_path) as f:
+            listing = json.load(f)
+        return {
+            package: {version: f"{package}-{version}.js" for version in versions}
+            for package, versions in listing.items()
+        }
+    return {}
 
 
 @functools.lru_cache(1)
-def _script_listing() -> Dict[str, List[str]]:
+def _bundled_listing() -> Dict[str, List[str]]:
     content = pkgutil.get_data("altair_viewer", "scripts/listing.json")
     if content is None:
         raise RuntimeError(
@@ -16,30 +84,183 @@ def _script_listing() -> Dict[str, List[str]]:
     return json.loads(content)
 
 
-def get_bundled_script(package: str, version: Optional[str] = None) -> str:
-    """Get a bundled script from this pacakge
+@functools.lru_cache(1)
+def _script_locations() -> Dict[Tuple[str, str], Optional[str]]:
+    """Map (package, version) to a script path, or None for bundled scripts."""
+    locations: Dict[Tuple[str, str], Optional[str]] = {}
+    for package, versions in _bundled_listing().items():
+        for version in versions:
+            locations[package, version] = None
+    for directory in _script_directories:
+        for package, files in _read_directory(directory).items():
+            for version, filename in files.items():
+                locations.setdefault(
+                    (package, version), os.path.join(directory, filename)
+                )
+    return locations
+
+
+@functools.lru_cache(1)
+def _script_listing() -> Dict[str, List[str]]:
+    listing: Dict[str, List[str]] = {}
+    for package, version in _script_locations():
+        listing.setdefault(package, []).append(version)
+    return {
+        package: [str(v) for v in sorted(map(Version, versions))]
+        for package, versions in listing.items()
+    }
+
+
+@functools.lru_cache(1)
+def _version_index() -> Dict[str, Dict[Optional[str], str]]:
+    """Map each package and version prefix to the resolved available version.
+
+    Keys are ``None`` (the newest release) and every major, major.minor and full
+    version string present in the listing.
+    """
+    index: Dict[str, Dict[Optional[str], str]] = {}
+    for package, candidates in _script_listing().items():
+        keys: List[Optional[str]] = [None]
+        for v in map(Version, candidates):
+            keys.append(str(v))
+            if v.dev is None:
+                keys.append(str(v.major))
+                if v.minor is not None:
+                    keys.append(f"{v.major}.{v.minor}")
+        resolved: Dict[Optional[str], str] = {}
+        for key in keys:
+            try:
+                resolved[key] = find_version(key, candidates)
+            except NoMatchingVersions:
+                pass
+        index[package] = resolved
+    return index
+
+
+def resolve_bundled_version(package: str, version: Optional[str] = None) -> str:
+    """Resolve a version specifier to the bundled version of a package.
+
+    Scripts in local script directories (see :func:`add_script_directory`) are
+    considered along with those bundled in this package.
 
     Parameters
     ----------
     package : str
-        The name of the package to get (e.g. "vega", "vega-lite", "vega-embed")
+        The name of the package (e.g. "vega", "vega-lite", "vega-embed")
     version : str (optional)
         The version of the package to use. If not specified, use the most recent
         available version.
 
     Returns
     -------
-    content : str
-        The content of the script.
+    version : str
+        The full version string of the bundled script.
     """
     listing = _script_listing()
     if package not in listing:
         raise ValueError(
             f"package {package!r} not recognized. Available: {list(listing)}"
         )
-    version_str = find_version(version, listing[package])
+    try:
+        return _version_index()[package][version]
+    except KeyError:
+        return find_version(version, listing[package])
+
+
+def get_bundled_script(package: str, version: Optional[str] = None) -> str:
+    """Get a bundled script from this pacakge
+
+    Scripts in local script directories (see :func:`add_script_directory`) are
+    considered along with those bundled in this package.
+
+    Parameters
+    ----------
+    package : str
+        The name of the package to get (e.g. "vega", "vega-lite", "vega-embed")
+    version : str (optional)
+        The version of the package to use. If not specified, use the most recent
+        available version.
+
+    Returns
+    -------
+    content : str
+        The content of the script.
+    """
+    version_str = resolve_bundled_version(package, version)
+    filepath = _script_locations()[package, version_str]
+    if filepath is not None:
+        with open(filepath, encoding="utf-8") as f:
+            return f.read()
     path = f"scripts/{package}-{version_str}.js"
     content = pkgutil.get_data("altair_viewer", path)
     if content is None:
         raise RuntimeError(f"Internal: cannot locate file altair_viewer/{path}")
     return content.decode()
+
+
+@functools.lru_cache(maxsize=8)
+def _combined_script(versions: Tuple[str, ...]) -> Tuple[str, str]:
+    """Concatenate the vega, vega-lite and vega-embed scripts into one bundle.
+
+    ``versions`` holds the resolved version of each of ``VENDOR_PACKAGES``.
+    Returns a short content hash of the bundle along with its content.
+    """
+    content = "\n;\n".join(
+        get_bundled_script(package, version)
+        for package, version in zip(VENDOR_PACKAGES, versions)
+    )
+    return hashlib.sha256(content.encode()).hexdigest()[:16], content
+
+
+def _store_script(
+    package: str, version: str, content: bytes, directory: Optional[str] = None
+) -> str:
+    """Store a script in a content-addressed script directory."""
+    if directory is None:
+        directory = _default_script_directory()
+    os.makedirs(directory, exist_ok=True)
+    filename = hashlib.sha256(content).hexdigest() + ".js"
+    filepath = os.path.join(directory, filename)
+    if not os.path.exists(filepath):
+        with open(filepath + ".tmp", "wb") as f:
+            f.write(content)
+        os.replace(filepath + ".tmp", filepath)
+
+    manifest_path = os.path.join(directory, MANIFEST)
+    manifest = _read_directory(directory) if os.path.exists(manifest_path) else {}
+    manifest.setdefault(package, {})[version] = filename
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    if directory not in _script_directories:
+        _script_directories.insert(0, directory)
+    _clear_caches()
+    return filepath
+
+
+def download_script(package: str, version: str, directory: Optional[str] = None) -> str:
+    """Download a script from the CDN into a local script directory.
+
+    Once downloaded, the script can be used offline exactly like a bundled script.
+
+    Parameters
+    ----------
+    package : str
+        The name of the package to download (e.g. "vega", "vega-lite", "vega-embed")
+    version : str
+        The full version of the package to download.
+    directory : str (optional)
+        The script directory to download into. Defaults to
+        ``$XDG_CACHE_HOME/altair_viewer/scripts``. The directory is searched for
+        the rest of the session; in later sessions, register it again with
+        :func:`add_script_directory` or ``ALTAIR_VIEWER_SCRIPT_PATH``.
+
+    Returns
+    -------
+    filepath : str
+        The path of the downloaded script.
+    """
+    with urlopen(CDN_URL.format(package=package, version=version)) as response:
+        content = response.read()
+    return _store_script(package, version, content, directory=directory)
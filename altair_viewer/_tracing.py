@@ -0,0 +1,125 @@
+import time
+from typing import Any, Dict, Optional
+
+
+class Tracer:
+    """Receiver of timed spans for the stages of displaying a chart.
+
+    Subclass this and override :meth:`span` to record spans, and pass an instance
+    as the ``tracer`` of :class:`ChartViewer` or ``EventProvider``. Spans are:
+
+    - ``queue``: a chart waiting for a background worker.
+    - ``convert``: converting a chart to the specification to send, including
+      ``to_dict()`` and serving externalized data.
+    - ``compile``: compiling a Vega-Lite specification on the server.
+    - ``serialize``: serializing the specification to JSON.
+    - ``publish``: encoding an event and handing it to the server's event loop.
+    - ``write``: writing and flushing an event to a single client.
+    - ``render``: rendering a chart in the browser, as reported by the page.
+
+    Spans of one call to ``display()`` share its ``display`` attribute.
+    """
+
+    def span(
+        self, name: str, start_ns: int, end_ns: int, attributes: Dict[str, Any]
+    ) -> None:
+        """Record a completed span.
+
+        Times are in nanoseconds since the epoch, as returned by ``time.time_ns()``.
+        This is called on the thread which ran the stage, which may be the server's
+        event loop, so it should be fast and thread-safe.
+        """
+
+
+class _NoSpan:
+    """A span which records nothing, used when tracing is disabled."""
+
+    def __enter__(self) -> "_NoSpan":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+    def set(self, key: str, value: Any) -> None:
+        """Set an attribute of the span."""
+
+
+class _Span(_NoSpan):
+    def __init__(self, tracer: Tracer, name: str, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = 0
+
+    def __enter__(self) -> "_Span":
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        if exc is not None:
+            self.attributes["error"] = repr(exc)
+        self.tracer.span(self.name, self.start_ns, time.time_ns(), self.attributes)
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+
+NO_SPAN = _NoSpan()
+
+
+def start_span(tracer: Optional[Tracer], name: str, **attributes: Any) -> _NoSpan:
+    """Return a context manager timing a span, which records nothing if tracer is None.
+
+    Examples
+    --------
+    >>> class PrintTracer(Tracer):
+    ...     def span(self, name, start_ns, end_ns, attributes):
+    ...         print(name, attributes)
+    >>> with start_span(PrintTracer(), "serialize", display=1) as span:
+    ...     span.set("bytes", 10)
+    serialize {'display': 1, 'bytes': 10}
+    >>> with start_span(None, "serialize", display=1) as span:
+    ...     span.set("bytes", 10)
+    """
+    if tracer is None:
+        return NO_SPAN
+    return _Span(tracer, name, attributes)
+
+
+class OpenTelemetryTracer(Tracer):
+    """Tracer which exports spans with OpenTelemetry.
+
+    Requires the ``opentelemetry-api`` package, and an OpenTelemetry SDK
+    configured to export spans.
+
+    Parameters
+    ----------
+    tracer_provider : opentelemetry.trace.TracerProvider (optional)
+        The tracer provider to use. If not specified, use the global provider.
+    """
+
+    def __init__(self, tracer_provider: Any = None) -> None:
+        try:
+            from opentelemetry import trace
+        except ImportError as err:
+            raise ImportError(
+                "OpenTelemetryTracer requires the opentelemetry-api package."
+            ) from err
+        self._tracer = trace.get_tracer(
+            "altair_viewer", tracer_provider=tracer_provider
+        )
+
+    def span(
+        self, name: str, start_ns: int, end_ns: int, attributes: Dict[str, Any]
+    ) -> None:
+        # OpenTelemetry attributes must be primitive values.
+        otel_attributes = {
+            f"altair_viewer.{key}": (
+                value if isinstance(value, (bool, int, float, str)) else str(value)
+            )
+            for key, value in attributes.items()
+        }
+        span = self._tracer.start_span(
+            f"altair_viewer.{name}", start_time=start_ns, attributes=otel_attributes
+        )
+        span.end(end_time=end_ns)
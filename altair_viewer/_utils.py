@@ -1,6 +1,11 @@
+import functools
 import math
 import re
-from typing import Any, NamedTuple, List, Optional, Tuple, Union
+from typing import Any, Dict, NamedTuple, List, Optional, Tuple, Type, TypeVar, Union
+
+_VERSION_REGEX = re.compile(
+    r"^(?P<major>\d+)(?:\.(?P<minor>\d+)(?:\.(?P<micro>\d+))?)?(?P<dev>.+)?$"
+)
 
 
 class NoMatchingVersions(RuntimeError):
@@ -14,9 +19,16 @@ class ParsedVersion(NamedTuple):
     dev: Optional[str]
 
 
+V = TypeVar("V", bound="Version")
+OrderTuple = Tuple[float, float, float, Tuple[float, ...]]
+
+
 class Version:
     """Parser for version strings.
 
+    Versions are immutable, and instances constructed from strings are interned,
+    so repeatedly parsing the same version string is cheap.
+
     Examples
     --------
     >>> Version('3.2.0')
@@ -27,30 +39,53 @@ class Version:
     True
     >>> Version(4).matches('4.2')
     True
+    >>> Version('3.2.0') is Version('3.2.0')
+    True
     """
 
+    __slots__ = ("major", "minor", "micro", "dev", "_order")
+
     major: int
     minor: Optional[int]
     micro: Optional[int]
     dev: Optional[str]
+    _order: OrderTuple
 
-    def __init__(
-        self,
+    def __new__(
+        cls: Type[V],
         major: Union[int, str],
         minor: Optional[int] = None,
         micro: Optional[int] = None,
         dev: Optional[str] = None,
-    ):
+    ) -> V:
         if isinstance(major, str):
             if not all(arg is None for arg in (minor, micro, dev)):
                 raise ValueError(
                     "If passing a string to Version, no other arguments should be used."
                 )
-            major, minor, micro, dev = self._parse(major)
-        self.major = major
-        self.minor = minor
-        self.micro = micro
-        self.dev = dev
+            return _interned_version(cls, major)  # type: ignore[arg-type]
+        self = super().__new__(cls)
+        object.__setattr__(self, "major", major)
+        object.__setattr__(self, "minor", minor)
+        object.__setattr__(self, "micro", micro)
+        object.__setattr__(self, "dev", dev)
+        object.__setattr__(
+            self,
+            "_order",
+            (
+                major,
+                -1 if minor is None else minor,
+                -1 if micro is None else micro,
+                tuple([math.inf] if dev is None else map(ord, dev)),
+            ),
+        )
+        return self
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return (self.__class__, (self.major, self.minor, self.micro, self.dev))
 
     def matches(self, other: Union[str, "Version"]) -> bool:
         """Check one-way matching between versions.
@@ -81,12 +116,10 @@ class Version:
                 return False
         return True
 
-    def _parse(self, version: str) -> ParsedVersion:
+    @staticmethod
+    def _parse(version: str) -> ParsedVersion:
         """Parse a string version."""
-        regex = re.compile(
-            r"^(?P<major>\d+)(?:\.(?P<minor>\d+)(?:\.(?P<micro>\d+))?)?(?P<dev>.+)?$"
-        )
-        match = regex.match(version)
+        match = _VERSION_REGEX.match(version)
         if not match:
             raise ValueError(f"Cannot parse version: {version!r}")
         dct = match.groupdict()
@@ -97,14 +130,9 @@ class Version:
             dev=dct.get("dev"),
         )
 
-    def _order_tuple(self) -> Tuple[float, float, float, Tuple[float, ...]]:
+    def _order_tuple(self) -> OrderTuple:
         """Tuple key for ordering comparisons."""
-        return (
-            self.major,
-            -1 if self.minor is None else self.minor,
-            -1 if self.micro is None else self.micro,
-            tuple([math.inf] if self.dev is None else map(ord, self.dev)),
-        )
+        return self._order
 
     def __eq__(self, other: Any) -> bool:
         if isinstance(other, str):
@@ -158,6 +186,30 @@ class Version:
         return version
 
 
+@functools.lru_cache(maxsize=1024)
+def _interned_version(cls: Type[V], version: str) -> V:
+    """Construct (and cache) a version instance from a string."""
+    return cls(*Version._parse(version))
+
+
+def is_vegalite(spec: Dict[str, Any], embed_opt: Optional[dict] = None) -> bool:
+    """Return True if vega-embed will treat spec as a Vega-Lite specification.
+
+    Examples
+    --------
+    >>> is_vegalite({"mark": "point"})
+    True
+    >>> is_vegalite({"$schema": "https://vega.github.io/schema/vega/v5.json"})
+    False
+    >>> is_vegalite({"mark": "point"}, {"mode": "vega"})
+    False
+    """
+    mode = (embed_opt or {}).get("mode")
+    if mode is not None:
+        return mode == "vega-lite"
+    return "/vega/" not in str(spec.get("$schema", ""))
+
+
 def find_version(
     version: Optional[str], candidates: List[str], strict_micro: bool = False
 ) -> str:
@@ -195,22 +247,30 @@ def find_version(
     >>> find_version("4.2.0-alpha0", ['3.1.0', '4.0.0', '4.1.0', '4.2.0-alpha0'])
     '4.2.0-alpha0'
     """
+    return _find_version(version, tuple(candidates), strict_micro)
+
+
+@functools.lru_cache(maxsize=256)
+def _find_version(
+    version: Optional[str], candidates: Tuple[str, ...], strict_micro: bool
+) -> str:
+    """Cached implementation of :func:`find_version`."""
     if not candidates:
         raise NoMatchingVersions("No candidate versions provided.")
     cand = sorted([Version(c) for c in candidates])
     if version is None:
-        cand = sorted(c for c in cand if c.dev is None)
-        if not candidates:
-            raise NoMatchingVersions(f"No non-dev candidates in {candidates}.")
+        cand = [c for c in cand if c.dev is None]
+        if not cand:
+            raise NoMatchingVersions(f"No non-dev candidates in {list(candidates)}.")
         return str(cand[-1])
 
     v = Version(version)
     if not strict_micro and not v.dev:
-        v.micro = None
+        v = Version(v.major, v.minor, None, v.dev)
     matches = [c for c in cand if v.matches(c)]
     if not matches:
         raise NoMatchingVersions(
-            f"No matches for version={version!r} among {candidates}.\n"
+            f"No matches for version={version!r} among {list(candidates)}.\n"
             "Often this can be fixed by updating altair_viewer:\n"
             "    pip install -U altair_viewer"
         )
@@ -1,23 +1,46 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import hashlib
 import json
+import logging
+import os
 import pkgutil
-from typing import Dict, Optional, Union
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 import uuid
+import warnings
 import webbrowser
 
 import altair as alt
 from altair_data_server import Provider, Resource
-from altair_viewer._scripts import get_bundled_script
+from altair_viewer._scripts import (
+    CDN_COMBINE_URL,
+    CDN_URL,
+    VENDOR_PACKAGES,
+    _combined_script,
+    get_bundled_script,
+    resolve_bundled_version,
+)
 from altair_viewer._event_provider import EventProvider, DataSource
+from altair_viewer._compile import CompileCache, compiler_available
+from altair_viewer._data import externalize_data
+from altair_viewer._history import History
+from altair_viewer._marks import choose_renderer
+from altair_viewer._progressive import CHUNK_ROWS, chunks, split_datasets
+from altair_viewer._resources import ResourcePool
+from altair_viewer._tracing import NO_SPAN, Tracer, _NoSpan, start_span
+from altair_viewer._utils import is_vegalite
 
-CDN_URL = "https://cdn.jsdelivr.net/npm/{package}@{version}"
+logger = logging.getLogger(__name__)
+
+# Bundled scripts are served at versioned URLs, so their content never changes.
+IMMUTABLE_HEADERS = {"cache-control": "public, max-age=31536000, immutable"}
 
 HTML = """
 <html>
   <head>
     <title>Altair Viewer</title>
-    <script src="{vega_url}"></script>
-    <script src="{vegalite_url}"></script>
-    <script src="{vegaembed_url}"></script>
+    {script_tags}
     <style>
     div.altair-chart {{
       position: absolute;
@@ -25,42 +48,369 @@ HTML = """
       top: 50%;
       transform: translate(-50%, -50%);
     }}
+    div.altair-history {{
+      display: none;
+      position: fixed;
+      top: 0;
+      left: 0;
+      right: 0;
+      padding: 4px 8px;
+      font-family: sans-serif;
+      font-size: 12px;
+    }}
+    div.altair-history input {{
+      width: 50%;
+      vertical-align: middle;
+    }}
     </style>
   </head>
   <body>
+    <div id="altair-history" class="altair-history">
+      <input id="altair-history-slider" type="range" min="0" max="0" value="0">
+      <span id="altair-history-label"></span>
+    </div>
     <div id="{output_div}" class="altair-chart"></div>
     <script type="text/javascript">
         var ws = new WebSocket("{websocket_url}");
+        const renderMode = {render_mode};
+        function showError(error) {{
+            const el = document.getElementById("{output_div}");
+            el.innerHTML = ('<div class="error" style="color:red;">'
+                            + '<p>JavaScript Error: ' + error.message + '</p>'
+                            + "<p>This usually means there's a typo in your chart specification. "
+                            + "See the javascript console for the full traceback.</p>"
+                            + '</div>');
+        }}
+        // Recently displayed specs by content hash, least recently used first.
+        // The server is told which specs are cached, so that it can send only the
+        // hash of a chart which is displayed again.
+        const specCacheSize = {client_cache_size};
+        const specCache = new Map();
+
+        function reportCached() {{
+            if (ws.readyState === WebSocket.OPEN) {{
+                ws.send(JSON.stringify({{cached: Array.from(specCache.keys())}}));
+            }}
+        }}
+        ws.onopen = reportCached;
+
+        function cacheSpec(hash, spec) {{
+            const added = !specCache.delete(hash);
+            specCache.set(hash, spec);
+            while (specCache.size > specCacheSize) {{
+                specCache.delete(specCache.keys().next().value);
+            }}
+            if (added) {{
+                reportCached();
+            }}
+        }}
+
+        function getSpec(data) {{
+            if (data["hash"] === undefined || specCacheSize === 0) {{
+                return Promise.resolve(data["spec"]);
+            }}
+            const hash = data["hash"];
+            if ("spec" in data) {{
+                cacheSpec(hash, data["spec"]);
+                return Promise.resolve(data["spec"]);
+            }}
+            if (specCache.has(hash)) {{
+                const spec = specCache.get(hash);
+                cacheSpec(hash, spec);
+                return Promise.resolve(spec);
+            }}
+            // Not cached, e.g. after a reload: fetch the spec from the server.
+            return fetch(data["url"])
+                .then(response => response.json())
+                .then(spec => {{
+                    cacheSpec(hash, spec);
+                    return spec;
+                }});
+        }}
+
         function showSpec(spec, embedOpt) {{
             const el = document.getElementById("{output_div}");
-            vegaEmbed(el, spec, embedOpt)
+            return vegaEmbed(el, spec, embedOpt)
                 .catch(error => {{
-                    el.innerHTML = ('<div class="error" style="color:red;">'
-                                    + '<p>JavaScript Error: ' + error.message + '</p>'
-                                    + "<p>This usually means there's a typo in your chart specification. "
-                                    + "See the javascript console for the full traceback.</p>"
-                                    + '</div>');
+                    showError(error);
                     throw error;
                 }});
         }}
 
-        var eventSource = new EventSource("/stream/spec");
+        // Progressive loading: charts arrive with a sample of large datasets, and
+        // the remaining rows are announced in chunks on the progress stream.
+        const progressiveEnabled = {progressive_enabled};
+        var currentView = null;
+        var currentId = null;
+        var progress = null;
+        var appliedChunks = new Set();
+        var applying = Promise.resolve();
 
-        eventSource.onmessage = function(event) {{
-            console.log("message:", event);
-            var data = JSON.parse(event.data);
-            console.log(data["spec"]);
-            console.log(data["embedOpt"]);
-            showSpec(data["spec"], data["embedOpt"]);
-        }};
+        function showView(promise, id) {{
+            currentView = null;
+            currentId = id;
+            appliedChunks = new Set();
+            promise.then(result => {{
+                if (currentId === id) {{
+                    currentView = result.view;
+                    applyProgress();
+                    listenSignals();
+                }}
+            }});
+        }}
 
-        eventSource.onerror = function(event) {{
-            console.log("error:", event);
-        }};
+        function applyProgress() {{
+            if (currentView === null || progress === null || progress.id !== currentId) {{
+                return;
+            }}
+            const view = currentView;
+            for (const chunk of progress.chunks) {{
+                if (appliedChunks.has(chunk.url)) {{
+                    continue;
+                }}
+                appliedChunks.add(chunk.url);
+                applying = applying
+                    .then(() => fetch(chunk.url))
+                    .then(response => response.json())
+                    .then(rows => {{
+                        if (view === currentView) {{
+                            const changes = vega.changeset().insert(rows);
+                            return view.change(chunk.dataset, changes).runAsync();
+                        }}
+                    }})
+                    .catch(error => console.log("error:", error));
+            }}
+        }}
+
+        // Signals with Python callbacks are announced over the websocket, with
+        // their throttle intervals in ms. Changes are batched, and each signal is
+        // sent back at most once per throttle interval.
+        var signalState = {{}};
+        var signalTimer = null;
+        var signalDue = Infinity;
+        var listenedView = null;
+        var listened = new Set();
+
+        function listenSignals() {{
+            if (currentView === null) {{
+                return;
+            }}
+            if (listenedView !== currentView) {{
+                listenedView = currentView;
+                listened = new Set();
+            }}
+            const view = currentView;
+            for (const name of Object.keys(signalState)) {{
+                if (listened.has(name)) {{
+                    continue;
+                }}
+                listened.add(name);
+                try {{
+                    view.addSignalListener(name, (name, value) => {{
+                        if (view === currentView && name in signalState) {{
+                            queueSignal(name, value);
+                        }}
+                    }});
+                }} catch (error) {{
+                    // The chart has no signal with this name.
+                }}
+            }}
+        }}
+
+        function updateSignals(throttles) {{
+            const state = {{}};
+            for (const [name, throttle] of Object.entries(throttles)) {{
+                state[name] = signalState[name] || {{last: 0, pending: false}};
+                state[name].throttle = throttle;
+            }}
+            signalState = state;
+            listenSignals();
+        }}
+
+        // Charts sent with an id are traced: the page reports how long each took
+        // to render, from receipt of the event until it was displayed.
+        function reportRendered(shown, id, received) {{
+            shown.then(() => {{
+                if (ws.readyState === WebSocket.OPEN) {{
+                    const duration_ms = performance.now() - received;
+                    ws.send(JSON.stringify({{rendered: {{id, duration_ms}}}}));
+                }}
+            }}).catch(() => {{}});
+        }}
+
+        function onSocketMessage(event) {{
+            const msg = JSON.parse(event.data);
+            if (msg.signals !== undefined) {{
+                updateSignals(msg.signals);
+            }}
+        }}
+        ws.onmessage = onSocketMessage;
+
+        function queueSignal(name, value) {{
+            const state = signalState[name];
+            state.value = value;
+            state.pending = true;
+            scheduleSignals();
+        }}
+
+        function scheduleSignals() {{
+            let due = Infinity;
+            for (const state of Object.values(signalState)) {{
+                if (state.pending) {{
+                    due = Math.min(due, state.last + state.throttle);
+                }}
+            }}
+            if (due === Infinity || (signalTimer !== null && signalDue <= due)) {{
+                return;
+            }}
+            clearTimeout(signalTimer);
+            signalDue = due;
+            signalTimer = setTimeout(flushSignals, Math.max(due - Date.now(), 0));
+        }}
+
+        function flushSignals() {{
+            signalTimer = null;
+            signalDue = Infinity;
+            const now = Date.now();
+            const batch = {{}};
+            for (const [name, state] of Object.entries(signalState)) {{
+                if (state.pending && now >= state.last + state.throttle) {{
+                    batch[name] = state.value;
+                    state.pending = false;
+                    state.last = now;
+                }}
+            }}
+            if (Object.keys(batch).length > 0 && ws.readyState === WebSocket.OPEN) {{
+                try {{
+                    ws.send(JSON.stringify({{signals: batch}}));
+                }} catch (error) {{
+                    console.log("error:", error);
+                }}
+            }}
+            scheduleSignals();
+        }}
+
+        // With a service worker, the page may load from its cache before the
+        // server is up, or outlive the server, so the websocket reconnects.
+        const serviceWorkerEnabled = {service_worker_enabled};
+
+        function reconnect() {{
+            setTimeout(() => {{
+                ws = new WebSocket("{websocket_url}");
+                ws.onopen = reportCached;
+                ws.onmessage = onSocketMessage;
+                ws.onclose = reconnect;
+            }}, 1000);
+        }}
+
+        if (serviceWorkerEnabled && "serviceWorker" in navigator) {{
+            ws.onclose = reconnect;
+            if (navigator.serviceWorker.controller) {{
+                // A new service worker replaced the cached page: load the new one.
+                navigator.serviceWorker.addEventListener(
+                    "controllerchange", () => location.reload());
+            }}
+            navigator.serviceWorker.register("/service-worker.js")
+                .catch(error => console.log("error:", error));
+        }}
+
+        // History timeline: scrubbing fetches past charts from the server.
+        const historyEnabled = {history_enabled};
+        const historySlider = document.getElementById("altair-history-slider");
+        var historyEntries = [];
+        var live = true;
 
-        eventSource.onopen = function() {{
-            console.log("open:", event);
+        function updateHistoryLabel() {{
+            const n = historyEntries.length;
+            const i = Number(historySlider.value);
+            document.getElementById("altair-history-label").textContent = (
+                `${{i + 1}} / ${{n}}` + (live ? " (live)" : ""));
+        }}
+
+        function updateHistory() {{
+            fetch("/history/spec")
+                .then(response => response.json())
+                .then(entries => {{
+                    historyEntries = entries;
+                    historySlider.max = Math.max(entries.length - 1, 0);
+                    if (live) {{
+                        historySlider.value = historySlider.max;
+                    }}
+                    document.getElementById("altair-history").style.display = (
+                        entries.length > 1 ? "block" : "none");
+                    updateHistoryLabel();
+                }});
+        }}
+
+        historySlider.oninput = function() {{
+            const i = Number(historySlider.value);
+            live = (i === historyEntries.length - 1);
+            updateHistoryLabel();
+            const url = `/history/spec/${{historyEntries[i]["id"]}}`;
+            if (renderMode === "worker") {{
+                worker.postMessage({{url}});
+                return;
+            }}
+            fetch(url)
+                .then(response => response.json())
+                .then(data => showView(showSpec(data["spec"], data["embedOpt"]), null));
         }};
+
+        if (renderMode === "worker") {{
+            // The worker subscribes to the event stream, and parses and renders
+            // charts off the main thread; only the rendered SVG is posted back.
+            var worker = new Worker("{worker_url}");
+            worker.onmessage = function(event) {{
+                const msg = event.data;
+                if (msg.type === "update" && historyEnabled) {{
+                    updateHistory();
+                }} else if (msg.type === "svg" && (live || msg.history)) {{
+                    document.getElementById("{output_div}").innerHTML = msg.svg;
+                }} else if (msg.type === "error") {{
+                    showError(msg);
+                }}
+            }};
+        }} else {{
+            var eventSource = new EventSource("/stream/spec");
+
+            eventSource.onmessage = function(event) {{
+                const received = performance.now();
+                console.log("message:", event);
+                var data = JSON.parse(event.data);
+                console.log(data["embedOpt"]);
+                if (live) {{
+                    const shown = getSpec(data)
+                        .catch(error => {{
+                            showError(error);
+                            throw error;
+                        }})
+                        .then(spec => showSpec(spec, data["embedOpt"]));
+                    showView(shown, data["progressive"]);
+                    if (data["id"] !== undefined) {{
+                        reportRendered(shown, data["id"], received);
+                    }}
+                }}
+                if (historyEnabled) {{
+                    updateHistory();
+                }}
+            }};
+
+            if (progressiveEnabled) {{
+                var progressSource = new EventSource("/stream/progress");
+                progressSource.onmessage = function(event) {{
+                    progress = JSON.parse(event.data);
+                    applyProgress();
+                }};
+            }}
+
+            eventSource.onerror = function(event) {{
+                console.log("error:", event);
+            }};
+
+            eventSource.onopen = function() {{
+                console.log("open:", event);
+            }};
+        }}
     </script>
   </body>
 </html>
@@ -76,13 +426,16 @@ INLINE_HTML = r"""
       "vega-lite": "{vegalite_url}",
       "vega-embed": "{vegaembed_url}",
     }};
-    function loadScript(lib) {{
+    const scriptUrls = {script_urls};
+    function loadScript(url) {{
       return new Promise(function(resolve, reject) {{
         var s = document.createElement('script');
-        s.src = urls[lib];
-        s.async = true;
-        s.onload = () => resolve(urls[lib]);
-        s.onerror = () => reject(`Error loading script: ${{urls[lib]}}`);
+        s.src = url;
+        // Dynamically inserted scripts with async=false are fetched in parallel
+        // but executed in insertion order.
+        s.async = false;
+        s.onload = () => resolve(url);
+        s.onerror = () => reject(`Error loading script: ${{url}}`);
         document.getElementsByTagName("head")[0].appendChild(s);
       }});
     }}
@@ -106,9 +459,7 @@ INLINE_HTML = r"""
     }} else if (typeof vegaEmbed === "function") {{
         displayChart(vegaEmbed);
     }} else {{
-        loadScript("vega")
-            .then(() => loadScript("vega-lite"))
-            .then(() => loadScript("vega-embed"))
+        Promise.all(scriptUrls.map(loadScript))
             .catch(showError)
             .then(() => displayChart(vegaEmbed));
     }}
@@ -116,14 +467,243 @@ INLINE_HTML = r"""
 </script>
 """
 
+# Renders charts to SVG with a headless Vega view, for the "worker" render mode.
+RENDER_WORKER_JS = r"""
+importScripts({script_urls});
+
+// The newest unrendered chart from each of the stream and the history.
+const pending = {{}};
+let busy = false;
+
+function isVega(spec, embedOpt) {{
+  if (embedOpt.mode) {{
+    return embedOpt.mode === "vega";
+  }}
+  return /\/vega\/v/.test(spec["$schema"] || "");
+}}
+
+async function toSVG(data) {{
+  const embedOpt = data["embedOpt"] || {{}};
+  let spec = data["spec"];
+  let config = embedOpt.config;
+  if (!isVega(spec, embedOpt)) {{
+    spec = vegaLite.compile(spec, {{config}}).spec;
+    config = undefined;
+  }}
+  const view = new vega.View(vega.parse(spec, config), {{renderer: "none"}});
+  try {{
+    return await view.toSVG();
+  }} finally {{
+    view.finalize();
+  }}
+}}
+
+async function renderPending() {{
+  busy = true;
+  while (pending.history || pending.stream) {{
+    const history = Boolean(pending.history);
+    const data = history ? pending.history : pending.stream;
+    delete pending[history ? "history" : "stream"];
+    try {{
+      postMessage({{type: "svg", svg: await toSVG(data), history}});
+    }} catch (error) {{
+      postMessage({{type: "error", message: error.message}});
+    }}
+  }}
+  busy = false;
+}}
+
+function schedule(kind, data) {{
+  pending[kind] = data;
+  if (!busy) {{
+    renderPending();
+  }}
+}}
+
+const eventSource = new EventSource("/stream/spec");
+eventSource.onmessage = function(event) {{
+  schedule("stream", JSON.parse(event.data));
+  postMessage({{type: "update"}});
+}};
+
+// Messages from the page request a chart from the history.
+onmessage = function(event) {{
+  fetch(event.data.url)
+    .then(response => response.json())
+    .then(data => schedule("history", data))
+    .catch(error => postMessage({{type: "error", message: error.message}}));
+}};
+"""
+
+# Precaches the viewer page and its scripts when the viewer has a fixed port, so
+# that a re-opened page renders from the cache while the server starts. The cache
+# name changes with the precached content, so a changed page installs a new worker.
+SERVICE_WORKER_JS = r"""
+const CACHE = "altair-viewer-{cache_hash}";
+const PRECACHE = new Set([{precache_urls}].map(url => new URL(url, self.location).href));
+
+self.addEventListener("install", event => {{
+  event.waitUntil(
+    caches.open(CACHE)
+      .then(cache => cache.addAll(Array.from(PRECACHE)))
+      .then(() => self.skipWaiting())
+  );
+}});
+
+self.addEventListener("activate", event => {{
+  event.waitUntil(
+    caches.keys()
+      .then(keys => Promise.all(
+        keys.filter(key => key.startsWith("altair-viewer-") && key !== CACHE)
+          .map(key => caches.delete(key))))
+      .then(() => self.clients.claim())
+  );
+}});
+
+// Other requests, including event streams and chart data, go to the server.
+self.addEventListener("fetch", event => {{
+  if (event.request.method !== "GET" || !PRECACHE.has(event.request.url)) {{
+    return;
+  }}
+  event.respondWith(
+    caches.open(CACHE)
+      .then(cache => cache.match(event.request))
+      .then(response => response || fetch(event.request))
+  );
+}});
+"""
+
+# Served without service_worker=True, to remove a worker registered for this port
+# by an earlier viewer, with its caches, so that pages load from the server.
+REMOVE_SERVICE_WORKER_JS = r"""
+self.addEventListener("install", () => self.skipWaiting());
+
+self.addEventListener("activate", event => {
+  event.waitUntil(
+    caches.keys()
+      .then(keys => Promise.all(
+        keys.filter(key => key.startsWith("altair-viewer-"))
+          .map(key => caches.delete(key))))
+      .then(() => self.registration.unregister())
+      .then(() => self.clients.matchAll({type: "window"}))
+      .then(clients => clients.forEach(client => client.navigate(client.url)))
+  );
+});
+"""
+
+# The service worker script must not be cached, so that browsers see new versions.
+NO_CACHE_HEADERS = {"cache-control": "no-cache"}
+
+# Served once per viewer and shared by all inline charts in "server" inline mode.
+INLINE_LOADER_JS = r"""
+(function() {{
+  const urls = {{
+    "vega": "{vega_url}",
+    "vega-lite": "{vegalite_url}",
+    "vega-embed": "{vegaembed_url}",
+  }};
+  const scriptUrls = {script_urls};
+  let vegaEmbedPromise = null;
+
+  function loadScript(url) {{
+    return new Promise(function(resolve, reject) {{
+      var s = document.createElement('script');
+      s.src = url;
+      s.async = false;
+      s.onload = () => resolve(url);
+      s.onerror = () => reject(`Error loading script: ${{url}}`);
+      document.getElementsByTagName("head")[0].appendChild(s);
+    }});
+  }}
+  function getVegaEmbed() {{
+    if (vegaEmbedPromise === null) {{
+      if(typeof define === "function" && define.amd) {{
+        // requirejs paths need '.js' extension stripped.
+        const paths = Object.keys(urls).reduce(function(paths, package) {{
+          paths[package] = urls[package].replace(/\.js$/, "");
+          return paths
+        }}, {{}})
+        requirejs.config({{paths}});
+        vegaEmbedPromise = new Promise(function(resolve, reject) {{
+          require(["vega-embed"], resolve, reject);
+        }});
+      }} else if (typeof vegaEmbed === "function") {{
+        vegaEmbedPromise = Promise.resolve(vegaEmbed);
+      }} else {{
+        vegaEmbedPromise = Promise.all(scriptUrls.map(loadScript)).then(() => vegaEmbed);
+      }}
+    }}
+    return vegaEmbedPromise;
+  }}
+  function fetchSpec(specUrl) {{
+    return fetch(specUrl).then(function(response) {{
+      if (!response.ok) {{
+        throw new Error(`Error loading chart ${{specUrl}}: ${{response.status}}`);
+      }}
+      return response.json();
+    }});
+  }}
+  function render(outputId, specUrl) {{
+    const outputDiv = document.getElementById(outputId);
+    Promise.all([getVegaEmbed(), fetchSpec(specUrl)])
+      .then(([vegaEmbed, data]) => vegaEmbed(outputDiv, data["spec"], data["embedOpt"]))
+      .catch(function(err) {{
+        outputDiv.innerHTML = `<div class="error" style="color:red;">Javascript Error: ${{err.message}}</div>`;
+        throw err;
+      }});
+  }}
+  window.altairViewer = {{render}};
+}})();
+"""
+
+INLINE_STUB_HTML = """
+<div id="{output_div}"></div>
+<script type="text/javascript">
+  (function(loaderUrl) {{
+    var loaders = window._altairViewerLoaders = window._altairViewerLoaders || {{}};
+    loaders[loaderUrl] = loaders[loaderUrl] || new Promise(function(resolve, reject) {{
+      var s = document.createElement('script');
+      s.src = loaderUrl;
+      s.onload = resolve;
+      s.onerror = () => reject(`Error loading script: ${{loaderUrl}}`);
+      document.getElementsByTagName("head")[0].appendChild(s);
+    }});
+    loaders[loaderUrl].then(() => altairViewer.render("{output_div}", "{spec_url}"));
+  }})("{loader_url}");
+</script>
+"""
+
+# Inline charts and the inline loader are fetched from the notebook's origin.
+CORS_HEADERS = {"access-control-allow-origin": "*"}
+
+SignalCallback = Callable[[str, Any], None]
+
+# If set, the global viewer is prewarmed on import: "open" also opens the viewer
+# page, while any other value except "" and "0" only starts the server.
+PREWARM_ENV = "ALTAIR_VIEWER_PREWARM"
+
 
 class DisplayedChart:
     """Show information about displayed charts."""
 
     url: str
+    _future: Optional["Future[None]"]
 
-    def __init__(self, url: str):
+    def __init__(self, url: str, future: Optional["Future[None]"] = None):
         self.url = url
+        self._future = future
+
+    def done(self) -> bool:
+        """Return True if the chart has been published to the viewer."""
+        return self._future is None or self._future.done()
+
+    def result(self, timeout: Optional[float] = None) -> None:
+        """Wait until the chart has been published to the viewer.
+
+        Raises any error encountered while converting or serializing the chart.
+        """
+        if self._future is not None:
+            self._future.result(timeout)
 
     def __repr__(self) -> str:
         return f"Displaying chart at {self.url}"
@@ -136,9 +716,128 @@ class DisplayedChart:
 
 
 class ChartViewer:
+    """Viewer for Altair charts, served from a local background server.
+
+    Parameters
+    ----------
+    use_bundled_js : bool
+        If True (default), serve the bundled Vega scripts. Otherwise load them from
+        the jsdelivr CDN.
+    vega_version, vegalite_version, vegaembed_version : str (optional)
+        The versions of the Vega, Vega-Lite and Vega-Embed scripts to use.
+    combine_scripts : bool
+        If True, serve vega, vega-lite and vega-embed as a single concatenated
+        script so that pages load them in one request. Default is False.
+    canvas_threshold : int or None
+        Charts with more than this many marks, estimated from their inline data,
+        are rendered to canvas rather than SVG unless ``embed_opt`` specifies a
+        renderer. Default is 10000. If None, use vega-embed's default renderer.
+    externalize_threshold : int or None
+        Inline datasets larger than this many bytes of JSON are served as separate,
+        cacheable resources, which the viewer page fetches in parallel, rather
+        than being sent inside the chart specification. Default is 100000. If None,
+        or if ``history_size`` is nonzero, data is always sent inline.
+    server_compile : bool
+        If True, compile Vega-Lite specifications to Vega in Python with
+        `vl-convert <https://github.com/vega/vl-convert>`_, caching recently
+        compiled specifications, so that the viewer page skips compilation.
+        Requires the ``vl-convert-python`` package; if it is not installed, or does
+        not support the Vega-Lite version, the page compiles charts as usual.
+        Default is False.
+    resource_budget : int
+        The number of bytes of chart resources (externalized data, and charts
+        served in "server" inline mode) to keep. Resources used by the displayed
+        chart are always kept; others are released, least recently used first,
+        when the budget is exceeded. Default is 100 MB.
+    client_cache_size : int
+        The number of recently displayed chart specifications which the viewer page
+        keeps in memory, keyed by content hash. Displaying a chart which every
+        connected page has cached sends only its hash. Default is 16. If 0, or with
+        ``history_size`` or ``render_mode="worker"``, specifications are always
+        sent in full.
+    progressive_rows : int or None
+        If specified, top-level datasets with more rows than this are displayed
+        progressively: the chart is first sent with a stratified sample of this many
+        rows of each large dataset, and the remaining rows are then streamed to the
+        viewer page in chunks and added to the rendered chart. History records only
+        the sampled charts. Not supported with ``render_mode="worker"``. Default is
+        None, which sends all data at once.
+    background_workers : int
+        If greater than zero, :meth:`display` returns immediately, and charts are
+        converted, serialized and published by a pool with this many worker threads.
+        If several charts are queued, only the newest is published. Default is 0,
+        which does all work on the calling thread.
+    history_size : int
+        The number of previously displayed charts to keep, so that the viewer page
+        can scrub back through them. History is stored compressed, with inline
+        datasets shared between charts. Default is 0, which disables history.
+    render_mode : str
+        How the viewer page renders charts. If "main" (default), charts are rendered
+        interactively with vega-embed on the page's main thread. If "worker",
+        charts are received, parsed and rendered to static SVG by a Web Worker,
+        which keeps the page responsive while large charts are processed.
+        Interactive features such as selections and tooltips are not available
+        in "worker" mode.
+    inline_mode : str
+        How inline charts are embedded in notebook outputs. If "full" (default),
+        each output contains the chart specification and the script loader. If
+        "server", each output contains only a small stub, and the specification
+        and loader are fetched from the running viewer server. Outputs in "server"
+        mode only display while the kernel that created them is running.
+    compression_level : int (optional)
+        If specified, gzip chart updates for viewer pages, and compress websocket
+        messages, at this zlib compression level (1-9). Each update is compressed
+        once, however many pages are connected. Default is None, which does not
+        compress.
+    compression_min_size : int
+        Updates smaller than this many bytes are sent uncompressed. Default is 1024.
+    port : int (optional)
+        The port on which to serve the viewer. If the port is in use, a warning is
+        shown and a random port is used instead. Default is None, which uses a
+        random port.
+    service_worker : bool
+        If True, the viewer page registers a service worker which caches the page
+        and its scripts, so that a re-opened viewer page renders before the server
+        has responded. Browsers cache per port, so this requires ``port``. Default
+        is False.
+    tracer : Tracer (optional)
+        If specified, record timed spans of each stage of displaying a chart with
+        this tracer, from conversion to rendering in the viewer page; see
+        :class:`Tracer`. Rendering is not traced with ``render_mode="worker"``.
+        Default is None, which disables tracing.
+    """
+
+    _canvas_threshold: Optional[int]
+    _client_cache_size: int
+    _combine_scripts: bool
+    _compile_cache: Optional[CompileCache]
+    _compression_level: Optional[int]
+    _compression_min_size: int
+    _externalize_threshold: Optional[int]
+    _history_size: int
+    _background_workers: int
+    _executor: Optional[ThreadPoolExecutor]
+    _init_lock: threading.Lock
+    _page_opened: bool
+    _publish_lock: threading.Lock
+    _display_seq: int
+    _published_seq: int
+    _inline_mode: str
+    _pool: ResourcePool
+    _port: Optional[int]
+    _progress: Optional[DataSource]
+    _progressive_rows: Optional[int]
+    _render_mode: str
     _provider: Optional[Provider]
+    _service_worker: bool
     _resources: Dict[str, Resource]
+    _signal_callbacks: Dict[str, List[Tuple[SignalCallback, int]]]
+    _signal_executor: Optional[ThreadPoolExecutor]
+    _signal_lock: threading.Lock
+    _pending_signals: Dict[str, Any]
+    _dispatching_signals: bool
     _stream: Optional[DataSource]
+    _tracer: Optional[Tracer]
     _use_bundled_js: bool
     _versions: Dict[str, Optional[str]]
 
@@ -148,10 +847,76 @@ class ChartViewer:
         vega_version: Optional[str] = alt.VEGA_VERSION,
         vegalite_version: Optional[str] = alt.VEGALITE_VERSION,
         vegaembed_version: Optional[str] = alt.VEGAEMBED_VERSION,
+        combine_scripts: bool = False,
+        inline_mode: str = "full",
+        history_size: int = 0,
+        background_workers: int = 0,
+        render_mode: str = "main",
+        canvas_threshold: Optional[int] = 10_000,
+        externalize_threshold: Optional[int] = 100_000,
+        server_compile: bool = False,
+        resource_budget: int = 100_000_000,
+        progressive_rows: Optional[int] = None,
+        client_cache_size: int = 16,
+        compression_level: Optional[int] = None,
+        compression_min_size: int = 1024,
+        port: Optional[int] = None,
+        service_worker: bool = False,
+        tracer: Optional[Tracer] = None,
     ):
+        if inline_mode not in ("full", "server"):
+            raise ValueError(
+                f"inline_mode must be 'full' or 'server'; got {inline_mode!r}"
+            )
+        if render_mode not in ("main", "worker"):
+            raise ValueError(
+                f"render_mode must be 'main' or 'worker'; got {render_mode!r}"
+            )
+        if service_worker and port is None:
+            raise ValueError("service_worker=True requires a port")
+        self._canvas_threshold = canvas_threshold
+        self._client_cache_size = client_cache_size
+        if progressive_rows is not None and render_mode == "worker":
+            raise ValueError(
+                "progressive_rows is not supported with render_mode='worker'"
+            )
+        self._combine_scripts = combine_scripts
+        self._compile_cache = None
+        self._compression_level = compression_level
+        self._compression_min_size = compression_min_size
+        if server_compile:
+            if compiler_available():
+                self._compile_cache = CompileCache()
+            else:
+                warnings.warn(
+                    "server_compile=True requires vl-convert-python; "
+                    "charts will be compiled in the browser."
+                )
+        self._externalize_threshold = externalize_threshold
+        self._inline_mode = inline_mode
+        self._pool = ResourcePool(max_bytes=resource_budget)
+        self._port = port
+        self._progress = None
+        self._progressive_rows = progressive_rows
+        self._render_mode = render_mode
+        self._history_size = history_size
+        self._background_workers = background_workers
+        self._executor = None
+        self._init_lock = threading.Lock()
+        self._page_opened = False
+        self._publish_lock = threading.Lock()
+        self._display_seq = 0
+        self._published_seq = 0
         self._provider = None
         self._resources = {}
+        self._service_worker = service_worker
+        self._signal_callbacks = {}
+        self._signal_executor = None
+        self._signal_lock = threading.Lock()
+        self._pending_signals = {}
+        self._dispatching_signals = False
         self._stream = None
+        self._tracer = tracer
         self._use_bundled_js = use_bundled_js
         self._versions = {
             "vega": vega_version,
@@ -173,40 +938,218 @@ class ChartViewer:
         else:
             return CDN_URL.format(package=package, version=self._versions.get(package))
 
+    def _script_urls(self) -> List[str]:
+        """URLs of the scripts to load, in execution order."""
+        if not self._combine_scripts:
+            return [self._package_url(package) for package in VENDOR_PACKAGES]
+        elif self._use_bundled_js:
+            return [self._resources["vendor"].url]
+        else:
+            return [
+                CDN_COMBINE_URL.format(
+                    packages=",".join(
+                        f"npm/{package}@{self._versions.get(package)}"
+                        for package in VENDOR_PACKAGES
+                    )
+                )
+            ]
+
     def _initialize(self) -> None:
         """Initialize the viewer."""
-        if self._provider is None:
-            self._provider = EventProvider()
-            if self._use_bundled_js:
-                for package in ["vega", "vega-lite", "vega-embed"]:
-                    self._resources[package] = self._provider.create(
-                        content=get_bundled_script(
+        with self._init_lock:
+            if self._provider is None:
+                self._provider = EventProvider(
+                    compression_level=self._compression_level,
+                    compression_min_size=self._compression_min_size,
+                    tracer=self._tracer,
+                )
+                self._start_provider()
+                if self._use_bundled_js:
+                    versions = []
+                    for package in VENDOR_PACKAGES:
+                        version = resolve_bundled_version(
                             package, self._versions.get(package)
+                        )
+                        versions.append(version)
+                        self._resources[package] = self._provider.create(
+                            content=get_bundled_script(package, version),
+                            route=f"scripts/{package}-{version}.js",
+                            headers=IMMUTABLE_HEADERS,
+                        )
+                    if self._combine_scripts:
+                        bundle_hash, bundle = _combined_script(tuple(versions))
+                        self._resources["vendor"] = self._provider.create(
+                            content=bundle,
+                            route=f"scripts/vendor-{bundle_hash}.js",
+                            headers=IMMUTABLE_HEADERS,
+                        )
+
+                favicon = pkgutil.get_data("altair_viewer", "static/favicon.ico")
+                if favicon is not None:
+                    self._resources["favicon.ico"] = self._provider.create(
+                        content=favicon, route="favicon.ico"
+                    )
+                if self._render_mode == "worker":
+                    # vega-embed needs a DOM, so the worker only loads vega and vega-lite.
+                    worker_scripts = [
+                        self._package_url("vega"),
+                        self._package_url("vega-lite"),
+                    ]
+                    self._resources["render-worker"] = self._provider.create(
+                        content=RENDER_WORKER_JS.format(
+                            script_urls=", ".join(
+                                json.dumps(url) for url in worker_scripts
+                            )
                         ),
-                        route=f"scripts/{package}.js",
+                        route="render-worker.js",
                     )
-
-            favicon = pkgutil.get_data("altair_viewer", "static/favicon.ico")
-            if favicon is not None:
-                self._resources["favicon.ico"] = self._provider.create(
-                    content=favicon, route="favicon.ico"
+                    script_urls = []
+                    worker_url = self._resources["render-worker"].url
+                    precache_urls = worker_scripts + [worker_url]
+                else:
+                    script_urls = self._script_urls()
+                    worker_url = ""
+                    precache_urls = script_urls
+                self._resources["main"] = self._provider.create(
+                    content=HTML.format(
+                        output_div="altair-chart",
+                        script_tags="\n    ".join(
+                            f'<script src="{url}"></script>' for url in script_urls
+                        ),
+                        websocket_url=self._websocket_url(),
+                        history_enabled=json.dumps(self._history_size > 0),
+                        render_mode=json.dumps(self._render_mode),
+                        progressive_enabled=json.dumps(
+                            self._progressive_rows is not None
+                        ),
+                        worker_url=worker_url,
+                        client_cache_size=self._client_cache_size,
+                        service_worker_enabled=json.dumps(
+                            self._service_worker_enabled()
+                        ),
+                    ),
+                    route="",
                 )
-            self._resources["main"] = self._provider.create(
-                content=HTML.format(
-                    output_div="altair-chart",
-                    vega_url=self._package_url("vega"),
-                    vegalite_url=self._package_url("vega-lite"),
-                    vegaembed_url=self._package_url("vega-embed"),
-                    websocket_url=self._websocket_url(),
-                ),
-                route="",
+                self._create_service_worker(precache_urls)
+                self._stream = self._provider.create_stream(
+                    "spec",
+                    history=(
+                        History(max_entries=self._history_size)
+                        if self._history_size > 0
+                        else None
+                    ),
+                )
+                if self._progressive_rows is not None:
+                    self._progress = self._provider.create_stream("progress")
+                self._provider.add_message_handler("signals", self._receive_signals)
+                if self._tracer is not None:
+                    self._provider.add_message_handler(
+                        "rendered", self._receive_rendered
+                    )
+                self._send_signal_throttles()
+
+    def _start_provider(self) -> None:
+        """Start the server, on the viewer's port if it is available."""
+        if self._provider is None:
+            raise RuntimeError("Internal: provider is None")
+        try:
+            self._provider.start(port=self._port)
+        except OSError:
+            if self._port is None:
+                raise
+            warnings.warn(
+                f"Port {self._port} is in use; "
+                "the viewer will be served on a random port."
             )
-            self._stream = self._provider.create_stream("spec")
+            self._provider.start()
+
+    def _service_worker_enabled(self) -> bool:
+        """Return True if the viewer page should register the service worker.
+
+        Browsers cache per port, so on a random port it would only add caches.
+        """
+        if self._provider is None:
+            raise RuntimeError("Internal: provider is None")
+        return self._service_worker and self._provider.port == self._port
+
+    def _create_service_worker(self, precache_urls: List[str]) -> None:
+        """Serve the service worker, which precaches the page and the given URLs."""
+        if self._provider is None:
+            raise RuntimeError("Internal: provider is None")
+        if self._service_worker_enabled():
+            precache_urls = [self._resources["main"].url] + precache_urls
+            if "favicon.ico" in self._resources:
+                precache_urls.append(self._resources["favicon.ico"].url)
+            content = self._resources["main"].content + "\n".join(precache_urls)
+            content = SERVICE_WORKER_JS.format(
+                cache_hash=hashlib.sha256(content.encode()).hexdigest()[:16],
+                precache_urls=", ".join(json.dumps(url) for url in precache_urls),
+            )
+        else:
+            content = REMOVE_SERVICE_WORKER_JS
+        self._resources["service-worker"] = self._provider.create(
+            content=content, route="service-worker.js", headers=NO_CACHE_HEADERS
+        )
+
+    def prewarm(self, open_browser: bool = False) -> "Future[None]":
+        """Start the viewer server on a background thread.
+
+        This reads and serves the viewer scripts, and optionally opens the viewer
+        page, before the first chart is displayed, so that it appears without the
+        startup delay.
+
+        Parameters
+        ----------
+        open_browser : bool
+            If True, also open the viewer page in a browser, and the next call to
+            :meth:`display` opens no window of its own, even if the page has not
+            connected yet. If False (default), only the server is started, and
+            :meth:`display` opens a browser window as usual.
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Completed when the server has started and the page has been opened,
+            raising any error encountered.
+        """
+        future: "Future[None]" = Future()
+        if open_browser:
+            self._page_opened = True
+
+        def run() -> None:
+            try:
+                self._initialize()
+                if open_browser:
+                    self._open_browser()
+            except Exception as err:
+                future.set_exception(err)
+            else:
+                future.set_result(None)
+
+        threading.Thread(target=run, name="altair_viewer-prewarm", daemon=True).start()
+        return future
+
+    def _open_browser(self) -> None:
+        if self._provider is None:
+            raise RuntimeError("Internal: provider is None")
+        self._provider._disconnect_event.clear()
+        webbrowser.open(self.url)
 
     def stop(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._signal_executor is not None:
+            # Callbacks may stop the viewer, so do not wait for them.
+            self._signal_executor.shutdown(wait=False)
+            self._signal_executor = None
         if self._provider is not None:
             self._provider.stop()
             self._provider = None
+        # Resources were served by the stopped provider.
+        self._resources = {}
+        self._pool = ResourcePool(max_bytes=self._pool.max_bytes)
+        self._published_seq = 0
 
     @property
     def url(self) -> str:
@@ -222,16 +1165,56 @@ class ChartViewer:
         if isinstance(chart, alt.TopLevelMixin):
             chart = chart.to_dict()
         assert isinstance(chart, dict)
+        embed_opt, _ = choose_renderer(chart, embed_opt, self._canvas_threshold)
+
+        if self._inline_mode == "server":
+            return self._inline_stub_html(chart, embed_opt)
 
         return INLINE_HTML.format(
             output_div=f"altair-chart-{uuid.uuid4().hex}",
             vega_url=self._package_url("vega"),
             vegalite_url=self._package_url("vega-lite"),
             vegaembed_url=self._package_url("vega-embed"),
+            script_urls=json.dumps(self._script_urls()),
             spec=json.dumps(chart),
             embedOpt=json.dumps(embed_opt or {}),
         )
 
+    def _inline_loader_url(self) -> str:
+        """Return the URL of the inline loader script, creating it if needed."""
+        if self._provider is None:
+            raise RuntimeError("Internal: provider is None")
+        if "inline-loader" not in self._resources:
+            self._resources["inline-loader"] = self._provider.create(
+                content=INLINE_LOADER_JS.format(
+                    vega_url=self._package_url("vega"),
+                    vegalite_url=self._package_url("vega-lite"),
+                    vegaembed_url=self._package_url("vega-embed"),
+                    script_urls=json.dumps(self._script_urls()),
+                ),
+                route="inline-loader.js",
+                headers=CORS_HEADERS,
+            )
+        return self._resources["inline-loader"].url
+
+    def _inline_stub_html(self, chart: dict, embed_opt: Optional[dict] = None) -> str:
+        """Return an inline HTML stub which fetches the chart from the server."""
+        if self._provider is None:
+            raise RuntimeError("Internal: provider is None")
+        content = json.dumps({"spec": chart, "embedOpt": embed_opt or {}})
+        chart_id = hashlib.sha256(content.encode()).hexdigest()[:16]
+        route = f"charts/{chart_id}.json"
+        # Outputs never release their charts, which are kept within the budget.
+        resource = self._pool.get(route) or self._pool.add(
+            route,
+            self._provider.create(content=content, route=route, headers=CORS_HEADERS),
+        )
+        return INLINE_STUB_HTML.format(
+            output_div=f"altair-chart-{uuid.uuid4().hex}",
+            loader_url=self._inline_loader_url(),
+            spec_url=resource.url,
+        )
+
     def display(
         self,
         chart: Union[dict, alt.TopLevelMixin],
@@ -260,26 +1243,300 @@ class ChartViewer:
         render : Jupyter renderer for chart.
         show : display a chart and start event loop.
         """
-        if isinstance(chart, alt.TopLevelMixin):
-            chart = chart.to_dict()
-        assert isinstance(chart, dict)
         self._initialize()
-        if self._stream is None:
-            raise RuntimeError("Internal: _stream is not defined.")
         if inline:
             from IPython import display
 
             display.display(display.HTML(self._inline_html(chart, embed_opt)))
             return None
 
-        self._stream.send(json.dumps({"spec": chart, "embedOpt": embed_opt or {}}))
+        with self._publish_lock:
+            self._display_seq += 1
+            seq = self._display_seq
+        future: Optional["Future[None]"] = None
+        if self._background_workers > 0:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    self._background_workers, thread_name_prefix="altair_viewer"
+                )
+            queued_ns = time.time_ns() if self._tracer is not None else 0
+            future = self._executor.submit(
+                self._publish, chart, embed_opt, seq, queued_ns
+            )
+        else:
+            self._publish(chart, embed_opt, seq)
         if self._provider is None:
             raise RuntimeError("Internal: provider is None")
 
-        if open_browser or (open_browser is None and not self._provider._connections):
-            self._provider._disconnect_event.clear()
-            webbrowser.open(self.url)
-        return DisplayedChart(self.url)
+        if open_browser is None:
+            # A page opened by prewarm() may not have connected yet.
+            open_browser = not (self._provider.connections or self._page_opened)
+        self._page_opened = False
+        if open_browser:
+            self._open_browser()
+        return DisplayedChart(self.url, future)
+
+    def _publish(
+        self,
+        chart: Union[dict, alt.TopLevelMixin],
+        embed_opt: Optional[dict],
+        seq: int,
+        queued_ns: int = 0,
+    ) -> None:
+        """Convert and serialize a chart, and send it to the viewer stream.
+
+        ``seq`` orders calls to :meth:`display`; charts superseded by a newer
+        display are dropped rather than published. ``queued_ns`` is the time at
+        which the chart was queued for a background worker, if it was traced.
+        """
+        tracer = self._tracer
+        if tracer is not None and queued_ns:
+            tracer.span("queue", queued_ns, time.time_ns(), {"display": seq})
+        if seq < self._display_seq:
+            return
+        with start_span(tracer, "convert", display=seq) as span:
+            chart, embed_opt, remaining = self._convert(chart, embed_opt, seq, span)
+        if self._compile_cache is not None and is_vegalite(chart, embed_opt):
+            with start_span(tracer, "compile", display=seq):
+                chart, embed_opt = self._compile(chart, embed_opt)
+        payload: Dict[str, Any] = {"embedOpt": embed_opt or {}}
+        if remaining:
+            payload["progressive"] = seq
+        if tracer is not None:
+            # The viewer page reports the render time of charts with an id.
+            payload["id"] = seq
+        with start_span(tracer, "serialize", display=seq) as span:
+            data = self._payload_data(chart, payload, seq)
+            span.set("bytes", len(data))
+        with self._publish_lock:
+            if seq < self._published_seq:
+                self._pool.release(seq)
+                return
+            if self._stream is None:
+                raise RuntimeError("Internal: _stream is not defined.")
+            self._stream.send(data, {"display": seq})
+            # Resources are owned by the display which published them.
+            self._pool.release(self._published_seq)
+            self._published_seq = seq
+        if remaining:
+            threading.Thread(
+                target=self._send_remaining,
+                args=(remaining, seq),
+                name="altair_viewer-progressive",
+                daemon=True,
+            ).start()
+
+    def _convert(
+        self,
+        chart: Union[dict, alt.TopLevelMixin],
+        embed_opt: Optional[dict],
+        seq: int,
+        span: _NoSpan = NO_SPAN,
+    ) -> Tuple[dict, dict, Dict[str, List[Any]]]:
+        """Convert a chart to the specification to send, with its embed options.
+
+        Also returns the rows left out of progressively displayed datasets. The
+        estimated mark count and chosen renderer are recorded on ``span``.
+        """
+        if isinstance(chart, alt.TopLevelMixin):
+            chart = chart.to_dict()
+        assert isinstance(chart, dict)
+        embed_opt, marks = choose_renderer(chart, embed_opt, self._canvas_threshold)
+        if marks is not None:
+            span.set("marks", marks)
+        span.set("renderer", embed_opt.get("renderer", "default"))
+        remaining: Dict[str, List[Any]] = {}
+        if self._progressive_rows is not None and is_vegalite(chart, embed_opt):
+            chart, remaining = split_datasets(chart, self._progressive_rows)
+        if self._externalize_threshold is not None and self._history_size == 0:
+            # Progressive datasets stay inline, so that the page can add rows to them.
+            chart = externalize_data(
+                chart,
+                self._externalize_threshold,
+                lambda content: self._data_url(content, owner=seq),
+                keep=remaining.keys(),
+            )
+        return chart, embed_opt, remaining
+
+    def on_signal(
+        self, name: str, callback: SignalCallback, throttle_ms: int = 100
+    ) -> None:
+        """Call a function when a signal of the displayed chart changes.
+
+        Selections defined by Vega-Lite parameters are signals with the name of the
+        parameter, whose value describes the selected points or interval. Signal
+        changes are batched by the viewer page, which sends each signal at most
+        once every ``throttle_ms`` milliseconds. Callbacks are called with the
+        name and new value of the signal on a worker thread, one at a time; if a
+        signal changes again while callbacks are busy, only its latest value is
+        passed to them.
+
+        Parameters
+        ----------
+        name : str
+            The name of the signal.
+        callback : callable
+            A function called as ``callback(name, value)``.
+        throttle_ms : int
+            The minimum interval between changes of the signal sent by the viewer
+            page, in milliseconds. Default is 100.
+        """
+        if self._render_mode == "worker":
+            raise ValueError("on_signal() is not supported with render_mode='worker'")
+        with self._signal_lock:
+            self._signal_callbacks.setdefault(name, []).append((callback, throttle_ms))
+        self._initialize()
+        self._send_signal_throttles()
+
+    def _send_signal_throttles(self) -> None:
+        """Tell viewer pages which signals to send, and how often."""
+        if self._provider is None:
+            raise RuntimeError("Internal: provider is None")
+        with self._signal_lock:
+            throttles = {
+                name: min(throttle for _, throttle in callbacks)
+                for name, callbacks in self._signal_callbacks.items()
+            }
+        if throttles:
+            self._provider.send_message("signals", throttles)
+
+    def _receive_signals(self, signals: Any) -> None:
+        """Queue signal changes sent by a viewer page, on the IOLoop thread."""
+        if not isinstance(signals, dict):
+            return
+        with self._signal_lock:
+            self._pending_signals.update(signals)
+            if self._dispatching_signals:
+                return
+            self._dispatching_signals = True
+            if self._signal_executor is None:
+                self._signal_executor = ThreadPoolExecutor(
+                    1, thread_name_prefix="altair_viewer-signals"
+                )
+            executor = self._signal_executor
+        executor.submit(self._dispatch_signals)
+
+    def _dispatch_signals(self) -> None:
+        """Call signal callbacks with the latest value of each changed signal."""
+        while True:
+            with self._signal_lock:
+                signals = self._pending_signals
+                self._pending_signals = {}
+                if not signals:
+                    self._dispatching_signals = False
+                    return
+                callbacks = {
+                    name: [callback for callback, _ in self._signal_callbacks[name]]
+                    for name in signals
+                    if name in self._signal_callbacks
+                }
+            for name, name_callbacks in callbacks.items():
+                for callback in name_callbacks:
+                    try:
+                        callback(name, signals[name])
+                    except Exception:
+                        logger.exception("Error in callback for signal %r", name)
+
+    def _receive_rendered(self, rendered: Any) -> None:
+        """Record the render time reported by a viewer page, on the IOLoop thread."""
+        if self._tracer is None or not isinstance(rendered, dict):
+            return
+        try:
+            duration_ns = int(float(rendered["duration_ms"]) * 1e6)
+        except (KeyError, TypeError, ValueError):
+            return
+        end_ns = time.time_ns()
+        attributes = {"display": rendered.get("id")}
+        self._tracer.span("render", end_ns - duration_ns, end_ns, attributes)
+
+    def _payload_data(self, chart: dict, payload: Dict[str, Any], seq: int) -> str:
+        """Serialize a chart payload, referencing the chart by hash if possible.
+
+        If every connected viewer page has cached the chart, the payload holds its
+        hash and a URL from which pages which have not cached it can fetch it.
+        """
+        if (
+            self._client_cache_size == 0
+            or self._history_size > 0
+            or self._render_mode == "worker"
+        ):
+            return json.dumps(dict(payload, spec=chart))
+        if self._provider is None:
+            raise RuntimeError("Internal: provider is None")
+        spec = json.dumps(chart)
+        payload["hash"] = hashlib.sha256(spec.encode()).hexdigest()[:16]
+        if self._provider.cached_by_clients(payload["hash"]):
+            payload["url"] = self._data_url(spec, owner=seq)
+            return json.dumps(payload)
+        # Splice in the serialized spec, rather than serializing it again.
+        return json.dumps(payload)[:-1] + ', "spec": ' + spec + "}"
+
+    def _send_remaining(self, remaining: Dict[str, List[Any]], seq: int) -> None:
+        """Serve the rows left out of a progressive chart, in chunks.
+
+        Each chunk is announced on the progress stream as soon as it is served.
+        Stops if the chart is replaced.
+        """
+        manifest: Dict[str, Any] = {"id": seq, "chunks": [], "complete": False}
+        for name, rows in chunks(remaining, CHUNK_ROWS):
+            content = json.dumps(rows)
+            with self._publish_lock:
+                if seq != self._published_seq or self._progress is None:
+                    return
+                url = self._data_url(content, owner=seq)
+                manifest["chunks"].append({"dataset": name, "url": url})
+                self._progress.send(json.dumps(manifest))
+        with self._publish_lock:
+            if seq == self._published_seq and self._progress is not None:
+                manifest["complete"] = True
+                self._progress.send(json.dumps(manifest))
+
+    def _compile(self, chart: dict, embed_opt: dict) -> Tuple[dict, dict]:
+        """Compile a Vega-Lite chart to Vega, if possible."""
+        if self._compile_cache is None:
+            raise RuntimeError("Internal: _compile_cache is None")
+        version = self._versions.get("vega-lite")
+        if self._use_bundled_js:
+            version = resolve_bundled_version("vega-lite", version)
+        compiled = self._compile_cache.compile(
+            chart,
+            version,
+            config=embed_opt.get("config"),
+            theme=embed_opt.get("theme"),
+        )
+        if compiled is None:
+            return chart, embed_opt
+        # Config and theme were applied during compilation.
+        embed_opt = {
+            key: value
+            for key, value in embed_opt.items()
+            if key not in ("config", "theme")
+        }
+        embed_opt["mode"] = "vega"
+        return compiled, embed_opt
+
+    def _data_url(self, content: str, owner: int) -> str:
+        """Serve externalized chart data, returning its URL."""
+        if self._provider is None:
+            raise RuntimeError("Internal: provider is None")
+        route = f"data/{hashlib.sha256(content.encode()).hexdigest()[:16]}.json"
+        resource = self._pool.get(route, owner) or self._pool.add(
+            route,
+            self._provider.create(
+                content=content, route=route, headers=IMMUTABLE_HEADERS
+            ),
+            owner,
+        )
+        return resource.url
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Return the number of bytes held by each stream and resource of the viewer.
+
+        Keys are the URL paths at which streams and resources are served.
+        """
+        if self._provider is None:
+            return {}
+        return self._provider.memory_usage()
 
     def render(
         self,
@@ -356,3 +1613,11 @@ class ChartViewer:
         print(msg)
         if self._provider is not None:
             self._provider._disconnect_event.wait()
+
+
+def _prewarm_from_environment(viewer: ChartViewer) -> Optional["Future[None]"]:
+    """Prewarm the viewer if requested by the ALTAIR_VIEWER_PREWARM variable."""
+    value = os.environ.get(PREWARM_ENV, "")
+    if value in ("", "0"):
+        return None
+    return viewer.prewarm(open_browser=value.lower() == "open")
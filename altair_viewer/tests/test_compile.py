@@ -0,0 +1,44 @@
+import pytest
+
+from altair_viewer._compile import CompileCache
+
+vl_convert = pytest.importorskip("vl_convert")
+
+SPEC = {"data": {"values": [{"x": 1}]}, "mark": "point"}
+
+
+def test_compile_cache(monkeypatch):
+    calls = []
+    vegalite_to_vega = vl_convert.vegalite_to_vega
+
+    def counting_vegalite_to_vega(spec, **kwargs):
+        calls.append(spec["mark"])
+        return vegalite_to_vega(spec, **kwargs)
+
+    monkeypatch.setattr(vl_convert, "vegalite_to_vega", counting_vegalite_to_vega)
+    cache = CompileCache(maxsize=2)
+    compiled = cache.compile(SPEC, "5.8.0")
+    assert compiled is not None
+    assert "vega/v5" in compiled["$schema"]
+    assert cache.compile(SPEC, "5.8.0") == compiled
+    assert calls == ["point"]
+
+    for mark in ["bar", "tick"]:
+        cache.compile(dict(SPEC, mark=mark), "5.8.0")
+    assert len(cache) == 2
+    cache.compile(SPEC, "5.8.0")
+    assert calls == ["point", "bar", "tick", "point"]
+
+
+def test_compile_config():
+    cache = CompileCache()
+    compiled = cache.compile(SPEC, config={"background": "red"})
+    assert compiled is not None
+    assert compiled["background"] == "red"
+
+
+@pytest.mark.parametrize(
+    "spec,version", [(SPEC, "3.4.0"), ({"mark": "not-a-mark"}, "5.8.0")]
+)
+def test_compile_fallback(spec, version):
+    assert CompileCache().compile(spec, version) is None
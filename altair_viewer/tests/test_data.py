@@ -0,0 +1,68 @@
+import json
+
+from altair_viewer._data import externalize_data
+
+
+def _store(stored):
+    def store(content):
+        stored.append(json.loads(content))
+        return f"data/{len(stored)}.json"
+
+    return store
+
+
+def test_externalize_datasets():
+    large = [{"x": i} for i in range(100)]
+    small = [{"x": 1}]
+    spec = {
+        "datasets": {"large": large, "small": small},
+        "layer": [
+            {"data": {"name": "large"}, "mark": "point"},
+            {"data": {"name": "small"}, "mark": "rule"},
+        ],
+    }
+    stored = []
+    result = externalize_data(spec, 100, _store(stored))
+    assert stored == [large]
+    assert result == {
+        "datasets": {"small": small},
+        "layer": [
+            {"data": {"url": "data/1.json"}, "mark": "point"},
+            {"data": {"name": "small"}, "mark": "rule"},
+        ],
+    }
+    assert spec["datasets"] == {"large": large, "small": small}
+
+
+def test_externalize_values():
+    values = [{"x": i} for i in range(100)]
+    spec = {
+        "data": {"values": values, "format": {"parse": {"x": "number"}}},
+        "mark": "point",
+        "transform": [{"lookup": "x", "from": {"data": {"values": values}}}],
+    }
+    stored = []
+    result = externalize_data(spec, 100, _store(stored))
+    assert stored == [values, values]
+    assert result["data"] == {
+        "url": "data/1.json",
+        "format": {"parse": {"x": "number"}},
+    }
+    assert result["transform"][0]["from"]["data"] == {"url": "data/2.json"}
+
+
+def test_externalize_named_values():
+    values = [{"x": i} for i in range(100)]
+    spec = {"data": {"name": "source", "values": values}, "mark": "point"}
+    stored = []
+    result = externalize_data(spec, 100, _store(stored))
+    assert stored == [values]
+    assert result["data"] == {"name": "source", "url": "data/1.json"}
+
+
+def test_externalize_keep():
+    large = [{"x": i} for i in range(100)]
+    spec = {"datasets": {"large": large}, "data": {"name": "large"}, "mark": "point"}
+    stored = []
+    assert externalize_data(spec, 100, _store(stored), keep={"large"}) == spec
+    assert stored == []
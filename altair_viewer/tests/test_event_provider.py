@@ -1,15 +1,37 @@
-import pytest
+import asyncio
+import gzip
+import json
+import socket
+import sys
+import threading
+import time
 from typing import Iterator
+import zlib
+
+import pytest
 
-from tornado.httpclient import HTTPClient, HTTPRequest
+from tornado.httpclient import AsyncHTTPClient, HTTPClient, HTTPClientError
+from tornado.httpclient import HTTPRequest
 from tornado.simple_httpclient import HTTPTimeoutError
+from tornado.websocket import websocket_connect
 
-from altair_viewer._event_provider import EventProvider
+from altair_viewer._event_provider import (
+    EventProvider,
+    EventStreamHandler,
+    GzipStream,
+    deflate_block,
+)
+from altair_viewer._history import History
+from altair_viewer.tests.test_tracing import RecordingTracer
 
 
 @pytest.fixture
-def http_client() -> HTTPClient:
-    return HTTPClient()
+def http_client() -> Iterator[HTTPClient]:
+    # Close the client's IOLoop here: if garbage collection closed it, that could
+    # happen on a server thread, racing with IOLoops created by the tests.
+    client = HTTPClient()
+    yield client
+    client.close()
 
 
 @pytest.fixture(scope="module")
@@ -20,6 +42,22 @@ def provider() -> Iterator[EventProvider]:
     provider.stop()
 
 
+def test_start_port_in_use(http_client):
+    with socket.socket() as sock:
+        sock.bind(("", 0))
+        sock.listen()
+        port = sock.getsockname()[1]
+        provider = EventProvider()
+        with pytest.raises(OSError):
+            provider.start(port=port)
+    provider.start(port=port)
+    try:
+        assert provider.url == f"http://localhost:{port}"
+        assert http_client.fetch(provider.url, raise_error=False).code == 404
+    finally:
+        provider.stop()
+
+
 def test_simple_stream(http_client, provider):
     stream = provider.create_stream("data")
     assert stream.url.endswith("stream/data")
@@ -35,3 +73,468 @@ def test_simple_stream(http_client, provider):
         with pytest.raises(HTTPTimeoutError):
             http_client.fetch(request)
         assert result == [f"data: {content}\n\n".encode()]
+
+
+def test_multiline_stream(http_client, provider):
+    stream = provider.create_stream("multiline")
+    stream.send('{\n  "a": 1\n}')
+    result = []
+    request = HTTPRequest(
+        url=stream.url, streaming_callback=result.append, request_timeout=0.5
+    )
+    with pytest.raises(HTTPTimeoutError):
+        http_client.fetch(request)
+    assert b"".join(result) == b'data: {\ndata:   "a": 1\ndata: }\n\n'
+
+
+def test_repeated_send(http_client, provider):
+    stream = provider.create_stream("repeated")
+    stream.send("AAAAA")
+    sent = stream._sent
+    # Unchanged data is not sent again.
+    stream.send("AAAAA")
+    assert stream._sent is sent
+    stream.send("BBBBB")
+    assert stream._sent.version == sent.version + 1
+
+
+def _stalled_client(url: str) -> socket.socket:
+    """Open a stream connection with a small receive buffer, without reading."""
+    host_port, path = url.split("//", 1)[1].split("/", 1)
+    host, port = host_port.split(":")
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.connect((host, int(port)))
+    sock.sendall(f"GET /{path} HTTP/1.0\r\nHost: {host_port}\r\n\r\n".encode())
+    return sock
+
+
+def _read_all(sock: socket.socket, timeout: float) -> bytes:
+    sock.settimeout(timeout)
+    chunks = []
+    try:
+        while True:
+            chunk = sock.recv(1 << 20)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    except socket.timeout:
+        pass
+    finally:
+        sock.close()
+    return b"".join(chunks)
+
+
+def test_slow_client_skips_to_latest():
+    provider = EventProvider(write_timeout=None)
+    try:
+        stream = provider.create_stream("slow")
+        sock = _stalled_client(stream.url)
+        stream.send("A" * 10_000_000)
+        time.sleep(0.5)
+        stream.send("B")
+        time.sleep(0.2)
+        stream.send("C")
+        body = _read_all(sock, timeout=2)
+    finally:
+        provider.stop()
+    events = body.split(b"\r\n\r\n", 1)[1].split(b"\n\n")
+    assert events[0] == b"data: " + b"A" * 10_000_000
+    assert events[1:] == [b"data: C", b""]
+
+
+def test_slow_client_timeout():
+    provider = EventProvider(write_timeout=0.2)
+    try:
+        stream = provider.create_stream("timeout")
+        sock = _stalled_client(stream.url)
+        stream.send("A" * 10_000_000)
+        time.sleep(1)
+        body = _read_all(sock, timeout=2)
+    finally:
+        provider.stop()
+    assert len(body) < 10_000_000
+
+
+def test_heartbeat(http_client):
+    provider = EventProvider(heartbeat_interval=0.1)
+    try:
+        stream = provider.create_stream("heartbeat")
+        stream.send("AAAAA")
+        result = []
+        request = HTTPRequest(
+            url=stream.url, streaming_callback=result.append, request_timeout=0.5
+        )
+        with pytest.raises(HTTPTimeoutError):
+            http_client.fetch(request)
+    finally:
+        provider.stop()
+    body = b"".join(result)
+    assert body.startswith(b"data: AAAAA\n\n:\n\n")
+    assert body.count(b":\n\n") >= 2
+
+
+def test_unresponsive_websocket_reaped():
+    provider = EventProvider(ping_interval=0.1, ping_timeout=0.1)
+    provider.start()
+    try:
+        host_port = provider.url.split("//", 1)[1]
+        host, port = host_port.split(":")
+        # Complete the websocket handshake, then never answer pings.
+        sock = socket.create_connection((host, int(port)))
+        sock.sendall(
+            (
+                "GET /websocket HTTP/1.1\r\n"
+                f"Host: {host_port}\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                "Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n"
+                "Sec-WebSocket-Version: 13\r\n\r\n"
+            ).encode()
+        )
+        assert sock.recv(1024).startswith(b"HTTP/1.1 101")
+        for _ in range(20):
+            if provider._connections:
+                break
+            time.sleep(0.005)
+        assert len(provider._connections) == 1
+
+        # The server sends a ping (opcode 0x89), then closes (opcode 0x88) when no
+        # pong arrives. Closing our end completes the closing handshake.
+        sock.settimeout(2)
+        received = b""
+        while b"\x88" not in received:
+            received += sock.recv(1024)
+        assert received.startswith(b"\x89")
+        sock.close()
+        assert provider._disconnect_event.wait(timeout=2)
+        assert not provider._connections
+    finally:
+        provider.stop()
+
+
+def test_traced_stream(http_client):
+    tracer = RecordingTracer()
+    provider = EventProvider(tracer=tracer)
+    try:
+        stream = provider.create_stream("traced")
+        stream.send("A", {"display": 3})
+        result = []
+        request = HTTPRequest(
+            url=stream.url, streaming_callback=result.append, request_timeout=0.5
+        )
+        with pytest.raises(HTTPTimeoutError):
+            http_client.fetch(request)
+    finally:
+        provider.stop()
+    assert result == [b"data: A\n\n"]
+    spans = {name: (start, end, attrs) for name, start, end, attrs in tracer.spans}
+    assert spans.keys() == {"publish", "write"}
+    attributes = {"display": 3, "stream": "traced", "version": 1, "bytes": 9}
+    assert spans["publish"][2] == attributes
+    assert spans["write"][2] == dict(attributes, client="127.0.0.1")
+    assert spans["publish"][0] <= spans["publish"][1] <= spans["write"][0]
+    assert spans["write"][0] <= spans["write"][1]
+
+
+def test_cached_by_clients(provider):
+    url = provider.url.replace("http://", "ws://") + "/websocket"
+
+    async def wait_until(condition):
+        for _ in range(200):
+            if condition():
+                return
+            await asyncio.sleep(0.005)
+        raise AssertionError("timed out")
+
+    async def check():
+        assert not provider.cached_by_clients("a")
+        first = await websocket_connect(url)
+        second = await websocket_connect(url)
+        await wait_until(lambda: len(provider._connections) == 2)
+        first.write_message(json.dumps({"cached": ["a", "b"]}))
+        first.write_message("not json")
+        await wait_until(lambda: any(conn.cached for conn in provider._connections))
+        assert not provider.cached_by_clients("a")
+        second.write_message(json.dumps({"cached": ["a"]}))
+        await wait_until(lambda: provider.cached_by_clients("a"))
+        assert not provider.cached_by_clients("b")
+        second.close()
+        await wait_until(lambda: provider.cached_by_clients("b"))
+        first.close()
+        await wait_until(lambda: not provider._connections)
+
+    asyncio.run(check())
+
+
+def test_websocket_messages():
+    provider = EventProvider()
+    received = []
+    provider.add_message_handler(
+        "ping", lambda value: received.append((value, threading.current_thread()))
+    )
+    provider.start()
+    url = provider.url.replace("http://", "ws://") + "/websocket"
+
+    async def check():
+        provider.send_message("a", 1)
+        conn = await websocket_connect(url)
+        assert json.loads(await conn.read_message()) == {"a": 1}
+        provider.send_message("b", [2])
+        assert json.loads(await conn.read_message()) == {"b": [2]}
+        conn.write_message(json.dumps({"ping": "x", "other": "y"}))
+        for _ in range(200):
+            if received:
+                break
+            await asyncio.sleep(0.005)
+        conn.close()
+
+    try:
+        asyncio.run(check())
+    finally:
+        provider.stop()
+    assert len(received) == 1
+    assert received[0][0] == "x"
+    assert received[0][1] is not threading.current_thread()
+
+
+async def _collect_events(urls, events, threads, done):
+    """Record the events of each stream while threads run, until done() is true."""
+    client = AsyncHTTPClient(force_instance=True, max_clients=len(urls))
+    for url, received in zip(urls, events):
+        request = HTTPRequest(
+            url, streaming_callback=received.append, request_timeout=60
+        )
+        client.fetch(request, raise_error=False)
+    await asyncio.sleep(0.05)
+    for thread in threads:
+        thread.start()
+    for _ in range(2000):
+        if not any(thread.is_alive() for thread in threads) and done():
+            break
+        await asyncio.sleep(0.005)
+    client.close()
+
+
+def _events(chunks):
+    return [e[len("data: ") :] for e in b"".join(chunks).decode().split("\n\n") if e]
+
+
+def _produce(stream, producer, n_sends):
+    for i in range(n_sends):
+        stream.send(f"{producer}:{i}")
+        if i % 50 == 0:
+            time.sleep(0.001)
+
+
+def _assert_in_order(events):
+    """Assert that each producer's events are in order, without repeats."""
+    last = {}
+    for event in events:
+        producer, i = map(int, event.split(":"))
+        assert i > last.get(producer, -1)
+        last[producer] = i
+
+
+@pytest.mark.parametrize("n_streams", [1, 4])
+def test_concurrent_producers(n_streams):
+    n_producers, n_sends = 8, 200
+    # Switch threads often, so that concurrent sends interleave.
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    provider = EventProvider()
+    streams = [provider.create_stream(f"stress-{i}") for i in range(n_streams)]
+    for stream in streams:
+        stream.send("start")
+    threads = [
+        threading.Thread(target=_produce, args=(streams[p % n_streams], p, n_sends))
+        for p in range(n_producers)
+    ]
+    # Two clients per stream.
+    clients = [stream for stream in streams for _ in range(2)]
+    events = [[] for _ in clients]
+
+    def done():
+        return all(
+            _events(received)[-1:] == [stream.data]
+            for stream, received in zip(clients, events)
+        )
+
+    try:
+        asyncio.run(_collect_events([s.url for s in clients], events, threads, done))
+    finally:
+        sys.setswitchinterval(switch_interval)
+        provider.stop()
+    assert done()
+    for stream in streams:
+        # The stream ends with the event of the last send to start.
+        assert stream._frame.version == 1 + n_sends * n_producers // n_streams
+        assert stream.data == stream._frame.data
+    for received in events:
+        _assert_in_order(_events(received)[1:])
+
+
+def test_send_read_your_writes(provider):
+    stream = provider.create_stream("read-your-writes")
+    for i in range(100):
+        stream.send(str(i))
+        assert stream.data == str(i)
+
+
+def test_concurrent_read_your_writes(monkeypatch, provider):
+    stream = provider.create_stream("concurrent-read-your-writes")
+    local = threading.local()
+    make_frame = stream._make_frame
+
+    def recording_make_frame(version, data):
+        # Slow down some sends, so that later sends overtake them.
+        local.version = version
+        if version % 3 == 0:
+            time.sleep(0.001)
+        return make_frame(version, data)
+
+    monkeypatch.setattr(stream, "_make_frame", recording_make_frame)
+    stale = []
+
+    def produce(i):
+        for j in range(500):
+            stream.send(f"{i}-{j}")
+            # The IOLoop may not have published it yet, so check the sent frame.
+            if stream._sent.version < local.version:
+                stale.append((local.version, stream._sent.version))
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=produce, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert stale == []
+
+
+def test_concurrent_history(monkeypatch, provider):
+    history = History()
+    stream = provider.create_stream("concurrent-history", history=history)
+    make_frame = stream._make_frame
+    versions = {}
+
+    def slow_make_frame(version, data):
+        # Slow down some sends, so that later sends overtake them.
+        versions[data] = version
+        if version % 3 == 0:
+            time.sleep(0.001)
+        return make_frame(version, data)
+
+    monkeypatch.setattr(stream, "_make_frame", slow_make_frame)
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [
+            threading.Thread(
+                target=lambda i: [stream.send(f"{i}-{j}") for j in range(200)],
+                args=(i,),
+            )
+            for i in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    for _ in range(100):
+        if history.entries() and history.get(history.entries()[-1]["id"]) == (
+            stream.data
+        ):
+            break
+        time.sleep(0.01)
+    # History records published events in stream order, ending with the latest.
+    entries = [history.get(entry["id"]) for entry in history.entries()]
+    assert entries[-1] == stream.data
+    entry_versions = [versions[entry] for entry in entries]
+    assert entry_versions == sorted(entry_versions)
+
+
+def test_stream_history(http_client, provider):
+    stream = provider.create_stream("with-history", history=History())
+    for content in ["AAAAA", "BBBBB"]:
+        stream.send(content)
+    url = f"{provider.url}/history/with-history"
+    entries = json.loads(http_client.fetch(url).body)
+    assert [e["id"] for e in entries] == [0, 1]
+    assert http_client.fetch(f"{url}/1").body == b"BBBBB"
+
+    with pytest.raises(HTTPClientError) as err:
+        http_client.fetch(f"{url}/2")
+    assert err.value.code == 404
+    with pytest.raises(HTTPClientError) as err:
+        http_client.fetch(f"{provider.url}/history/data")
+    assert err.value.code == 404
+
+
+@pytest.mark.parametrize("accept_encoding", ["gzip", "identity"])
+def test_compressed_stream(http_client, accept_encoding):
+    provider = EventProvider(compression_level=6, compression_min_size=100)
+    try:
+        stream = provider.create_stream("compressed")
+        stream.send("A" * 10_000)
+        result = []
+        request = HTTPRequest(
+            url=stream.url,
+            headers={"Accept-Encoding": accept_encoding},
+            decompress_response=False,
+            header_callback=lambda line: result.append(line.encode().lower()),
+            streaming_callback=result.append,
+            request_timeout=0.5,
+        )
+        with pytest.raises(HTTPTimeoutError):
+            http_client.fetch(request)
+    finally:
+        provider.stop()
+    headers, body = b"".join(result).split(b"\r\n\r\n", 1)
+    if accept_encoding == "gzip":
+        assert b"content-encoding: gzip" in headers
+        assert len(body) < 1000
+        body = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(body)
+    else:
+        assert b"content-encoding" not in headers
+    assert body == f"data: {'A' * 10_000}\n\n".encode()
+
+
+def test_gzip_stream():
+    events = [b"data: " + b"A" * 1000 + b"\n\n", b":\n\n", b"data: B\n\n"]
+    stream = GzipStream()
+    body = b"".join(stream.encode(e, deflate_block(e, 6)) for e in events)
+    assert gzip.decompress(body + stream.trailer()) == b"".join(events)
+    assert gzip.decompress(GzipStream().trailer()) == b""
+
+
+def test_chunked_writes(monkeypatch, http_client):
+    writes = []
+    write = EventStreamHandler.write
+
+    def recording_write(self, chunk):
+        writes.append(len(chunk))
+        return write(self, chunk)
+
+    monkeypatch.setattr(EventStreamHandler, "write", recording_write)
+    provider = EventProvider(write_chunk_size=1000)
+    try:
+        stream = provider.create_stream("chunked")
+        content = "A" * 10_000
+        stream.send(content)
+        result = []
+        request = HTTPRequest(
+            url=stream.url, streaming_callback=result.append, request_timeout=0.5
+        )
+        with pytest.raises(HTTPTimeoutError):
+            http_client.fetch(request)
+    finally:
+        provider.stop()
+    assert b"".join(result) == f"data: {content}\n\n".encode()
+    assert len(writes) == 11
+    assert max(writes) == 1000
@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from altair_viewer._history import History
+
+
+def make_data(values: list, mark: str = "point") -> str:
+    return json.dumps(
+        {
+            "spec": {
+                "data": {"name": "data-1"},
+                "mark": mark,
+                "datasets": {"data-1": values},
+            },
+            "embedOpt": {},
+        }
+    )
+
+
+def test_history_roundtrip() -> None:
+    history = History()
+    data = [make_data([{"x": 1}]), "not json", json.dumps({"spec": {}})]
+    for d in data:
+        history.append(d)
+    entries = history.entries()
+    assert [e["id"] for e in entries] == [0, 1, 2]
+    assert [e["size"] for e in entries] == [len(d) for d in data]
+    assert json.loads(history.get(0)) == json.loads(data[0])
+    assert history.get(1) == data[1]
+    assert history.get(2) == data[2]
+
+
+def test_history_skips_repeats() -> None:
+    history = History()
+    history.append("A")
+    history.append("A")
+    history.append("B")
+    history.append("A")
+    assert [history.get(e["id"]) for e in history.entries()] == ["A", "B", "A"]
+
+
+def test_history_shares_datasets() -> None:
+    values = [{"x": i, "y": i**2} for i in range(10_000)]
+    history = History()
+    history.append(make_data(values, "point"))
+    nbytes = history.nbytes
+    history.append(make_data(values, "line"))
+    assert len(history._datasets) == 1
+    assert history.nbytes - nbytes < 200
+    for entry, mark in zip(history.entries(), ["point", "line"]):
+        spec = json.loads(history.get(entry["id"]))["spec"]
+        assert spec["mark"] == mark
+        assert spec["datasets"] == {"data-1": values}
+
+
+def test_history_max_entries() -> None:
+    history = History(max_entries=3)
+    for i in range(5):
+        history.append(make_data([{"x": i}]))
+    assert [e["id"] for e in history.entries()] == [2, 3, 4]
+    assert len(history._datasets) == 3
+    with pytest.raises(KeyError):
+        history.get(0)
+
+
+def test_history_evicts_least_recently_used() -> None:
+    history = History(max_entries=3)
+    for data in "ABC":
+        history.append(data)
+    history.get(0)
+    history.append("D")
+    assert [e["id"] for e in history.entries()] == [0, 2, 3]
+
+
+def test_history_max_bytes() -> None:
+    history = History(max_bytes=1_000)
+    for i in range(100):
+        history.append(make_data([{"x": i, "i": j} for j in range(i)]))
+    assert history.nbytes <= 1_000 or len(history.entries()) == 1
+    assert history.entries()[-1]["id"] == 99
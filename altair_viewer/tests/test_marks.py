@@ -0,0 +1,40 @@
+import altair as alt
+import pytest
+
+from altair_viewer._marks import choose_renderer, estimate_mark_count
+
+
+@pytest.fixture
+def data() -> alt.Data:
+    return alt.Data(values=[{"x": i, "y": i} for i in range(100)])
+
+
+def test_estimate_mark_count(data: alt.Data):
+    base = alt.Chart(data).encode(x="x:Q", y="y:Q")
+    assert estimate_mark_count(base.mark_point().to_dict()) == 100
+    assert estimate_mark_count(base.mark_line().to_dict()) == 1
+    assert estimate_mark_count((base.mark_point() + base.mark_line()).to_dict()) == 101
+    assert estimate_mark_count((base.mark_point() | base.mark_bar()).to_dict()) == 200
+    repeated = (
+        alt.Chart(data)
+        .mark_point()
+        .encode(x=alt.X(alt.repeat("column"), type="quantitative"))
+        .repeat(column=["x", "y"])
+    )
+    assert estimate_mark_count(repeated.to_dict()) == 200
+    assert estimate_mark_count(alt.Chart("data.csv").mark_point().to_dict()) == 0
+
+
+@pytest.mark.parametrize(
+    "embed_opt,threshold,expected,marks",
+    [
+        (None, 50, {"renderer": "canvas"}, 100),
+        (None, 100, {}, 100),
+        (None, None, {}, None),
+        ({"renderer": "svg"}, 50, {"renderer": "svg"}, None),
+        ({"mode": "vega"}, 50, {"mode": "vega"}, None),
+    ],
+)
+def test_choose_renderer(data: alt.Data, embed_opt, threshold, expected, marks):
+    spec = alt.Chart(data).mark_point().to_dict()
+    assert choose_renderer(spec, embed_opt, threshold) == (expected, marks)
@@ -0,0 +1,30 @@
+from altair_viewer._progressive import chunks, split_datasets, stratified_sample
+
+
+def test_stratified_sample():
+    values = list(range(100))
+    sample, remaining = stratified_sample(values, 10)
+    assert sample == list(range(0, 100, 10))
+    assert sorted(sample + remaining) == values
+    assert stratified_sample(values[:3], 10) == ([0, 1, 2], [])
+
+
+def test_split_datasets():
+    spec = {"datasets": {"large": list(range(100)), "small": [1, 2]}, "mark": "point"}
+    result, remaining = split_datasets(spec, 10)
+    assert result["datasets"]["large"] == list(range(0, 100, 10))
+    assert result["datasets"]["small"] == [1, 2]
+    assert list(remaining) == ["large"]
+    assert len(remaining["large"]) == 90
+    assert spec["datasets"]["large"] == list(range(100))
+    assert split_datasets(spec, 100) == (spec, {})
+
+
+def test_chunks():
+    remaining = {"a": list(range(5)), "b": [5]}
+    assert list(chunks(remaining, 2)) == [
+        ("a", [0, 1]),
+        ("a", [2, 3]),
+        ("a", [4]),
+        ("b", [5]),
+    ]
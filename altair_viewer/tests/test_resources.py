@@ -0,0 +1,47 @@
+from typing import Iterator
+
+import pytest
+
+from altair_data_server import Provider, Resource
+
+from altair_viewer._resources import ResourcePool, resource_nbytes
+
+
+@pytest.fixture(scope="module")
+def provider() -> Iterator[Provider]:
+    provider = Provider()
+    yield provider
+    provider.stop()
+
+
+def _resource(provider: Provider, name: str, size: int = 10) -> Resource:
+    return provider.create(content="x" * size, route=name)
+
+
+def test_resource_nbytes(provider):
+    assert resource_nbytes(provider.create(content="abc")) == 3
+    assert resource_nbytes(provider.create(content="é")) == 2
+
+
+def test_pool_lru_eviction(provider):
+    pool = ResourcePool(max_bytes=25)
+    for name in ["a", "b"]:
+        pool.add(name, _resource(provider, name))
+    assert pool.get("a") is not None
+    pool.add("c", _resource(provider, "c"))
+    assert "b" not in pool
+    assert "a" in pool and "c" in pool
+    assert pool.nbytes == 20
+
+
+def test_pool_owned_resources_kept(provider):
+    pool = ResourcePool(max_bytes=0)
+    resource = pool.add("a", _resource(provider, "a"), owner=1)
+    assert pool.add("a", _resource(provider, "a"), owner=2) is resource
+    pool.add("b", _resource(provider, "b"))
+    assert "b" not in pool
+    pool.release(1)
+    assert "a" in pool
+    pool.release(2)
+    assert "a" not in pool
+    assert pool.nbytes == 0
@@ -1,6 +1,29 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Iterator, List
+
 import pytest
 
-from altair_viewer import get_bundled_script, NoMatchingVersions
+from altair_viewer import _scripts
+from altair_viewer import (
+    add_script_directory,
+    get_bundled_script,
+    resolve_bundled_version,
+    NoMatchingVersions,
+)
+
+
+@pytest.fixture(autouse=True)
+def script_directories() -> Iterator[List[str]]:
+    # Only search the bundled scripts, whatever the local script directories.
+    original = _scripts._script_directories[:]
+    _scripts._script_directories[:] = []
+    _scripts._clear_caches()
+    yield _scripts._script_directories
+    _scripts._script_directories[:] = original
+    _scripts._clear_caches()
 
 
 @pytest.mark.parametrize("package", ["vega", "vega-lite", "vega-embed"])
@@ -26,3 +49,67 @@ def test_get_bundled_script_error() -> None:
     with pytest.raises(ValueError) as err:
         get_bundled_script("vega-light")
     assert str(err.value).startswith("package 'vega-light' not recognized.")
+
+
+@pytest.mark.parametrize(
+    "package,version,expected",
+    [
+        ("vega", None, "5.25.0"),
+        ("vega", "5", "5.25.0"),
+        ("vega", "5.10", "5.10.1"),
+        ("vega", "5.10.0", "5.10.1"),
+        ("vega-lite", "4", "4.17.0"),
+        ("vega-lite", "5.8.0", "5.8.0"),
+        ("vega-embed", "6.5.2", "6.5.2"),
+    ],
+)
+def test_resolve_bundled_version(package: str, version: str, expected: str) -> None:
+    assert resolve_bundled_version(package, version) == expected
+
+
+def test_resolve_bundled_version_error() -> None:
+    with pytest.raises(NoMatchingVersions):
+        resolve_bundled_version("vega-lite", "1.0")
+    with pytest.raises(ValueError):
+        resolve_bundled_version("vega-light")
+
+
+def test_store_script(script_directories: List[str], tmp_path: Path) -> None:
+    content = b"!function(){/* vega-lite 5.99.0 */}"
+    filepath = _scripts._store_script("vega-lite", "5.99.0", content, str(tmp_path))
+    assert os.path.basename(filepath) == hashlib.sha256(content).hexdigest() + ".js"
+    assert str(tmp_path) in script_directories
+
+    manifest = json.loads((tmp_path / "manifest.json").read_text())
+    assert manifest == {"vega-lite": {"5.99.0": os.path.basename(filepath)}}
+
+    assert resolve_bundled_version("vega-lite") == "5.99.0"
+    assert resolve_bundled_version("vega-lite", "5.99") == "5.99.0"
+    assert get_bundled_script("vega-lite", "5.99.0") == content.decode()
+    # Bundled versions remain available.
+    assert get_bundled_script("vega-lite", "5.8.0").startswith("!function(")
+
+
+def test_add_script_directory(script_directories: List[str], tmp_path: Path) -> None:
+    (tmp_path / "listing.json").write_text(json.dumps({"vega": ["5.99.1"]}))
+    (tmp_path / "vega-5.99.1.js").write_text("!function(){/* vega */}")
+    with pytest.raises(NoMatchingVersions):
+        resolve_bundled_version("vega", "5.99")
+
+    add_script_directory(str(tmp_path))
+    assert resolve_bundled_version("vega", "5.99") == "5.99.1"
+    assert get_bundled_script("vega", "5.99") == "!function(){/* vega */}"
+
+
+def test_env_script_directories(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setenv("ALTAIR_VIEWER_SCRIPT_PATH", os.pathsep.join(["a", "", "b"]))
+    assert _scripts._env_script_directories() == [
+        os.path.abspath("a"),
+        os.path.abspath("b"),
+    ]
+    monkeypatch.delenv("ALTAIR_VIEWER_SCRIPT_PATH")
+    # The default download directory is not searched unless registered.
+    assert _scripts._env_script_directories() == []
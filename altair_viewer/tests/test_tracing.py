@@ -0,0 +1,56 @@
+import pytest
+
+from altair_viewer._tracing import NO_SPAN, OpenTelemetryTracer, Tracer, start_span
+
+
+class RecordingTracer(Tracer):
+    def __init__(self):
+        self.spans = []
+
+    def span(self, name, start_ns, end_ns, attributes):
+        self.spans.append((name, start_ns, end_ns, attributes))
+
+
+def test_start_span():
+    tracer = RecordingTracer()
+    with start_span(tracer, "serialize", display=1) as span:
+        span.set("bytes", 10)
+    [(name, start_ns, end_ns, attributes)] = tracer.spans
+    assert name == "serialize"
+    assert 0 < start_ns <= end_ns
+    assert attributes == {"display": 1, "bytes": 10}
+
+
+def test_start_span_error():
+    tracer = RecordingTracer()
+    with pytest.raises(ValueError):
+        with start_span(tracer, "convert"):
+            raise ValueError("bad chart")
+    assert tracer.spans[0][3] == {"error": "ValueError('bad chart')"}
+
+
+def test_start_span_disabled():
+    assert start_span(None, "convert", display=1) is NO_SPAN
+
+
+def test_opentelemetry_tracer():
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+        InMemorySpanExporter,
+    )
+
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    tracer = OpenTelemetryTracer(tracer_provider=provider)
+    tracer.span("write", 1000, 3000, {"version": 2, "client": None})
+
+    [span] = exporter.get_finished_spans()
+    assert span.name == "altair_viewer.write"
+    assert (span.start_time, span.end_time) == (1000, 3000)
+    assert dict(span.attributes) == {
+        "altair_viewer.version": 2,
+        "altair_viewer.client": "None",
+    }
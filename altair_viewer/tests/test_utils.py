@@ -4,7 +4,7 @@ from typing import Any, Callable, Dict, List, Tuple, Union
 
 import pytest
 
-from altair_viewer._utils import Version, find_version
+from altair_viewer._utils import NoMatchingVersions, Version, find_version
 
 
 OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
@@ -129,3 +129,30 @@ def test_version_repr(version: str) -> None:
 def test_version_str(version: str) -> None:
     v = Version(version)
     assert str(v) == version
+
+
+def test_version_interning() -> None:
+    assert Version("4.2.0") is Version("4.2.0")
+    assert Version(4, 2, 0) == Version("4.2.0")
+
+
+def test_version_immutable() -> None:
+    v = Version("4.2.0")
+    with pytest.raises(AttributeError):
+        v.micro = None  # type: ignore[misc]
+    assert str(Version("4.2.0")) == "4.2.0"
+
+
+@pytest.mark.parametrize("strict_micro", [True, False])
+def test_find_version_cached(strict_micro: bool) -> None:
+    candidates = ["4.0.0", "4.0.1", "4.0.2"]
+    first = find_version("4.0.0", candidates, strict_micro=strict_micro)
+    # Cached results must not depend on the identity of the candidates list.
+    second = find_version("4.0.0", candidates[:], strict_micro=strict_micro)
+    assert first == second == ("4.0.0" if strict_micro else "4.0.2")
+
+
+def test_find_version_no_dev_candidates() -> None:
+    with pytest.raises(NoMatchingVersions) as err:
+        find_version(None, ["4.0.0.dev0", "4.0.1.dev0"])
+    assert str(err.value).startswith("No non-dev candidates")
@@ -1,15 +1,25 @@
+import asyncio
+import gc
+import json
 import re
+import socket
 import threading
-from typing import Any, Dict, Iterable, List, Tuple
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
 import webbrowser
+import zlib
 
 import altair as alt
 from IPython import display
 import pytest
-from tornado.httpclient import HTTPClient
-
-from altair_viewer import ChartViewer
+from tornado.httpclient import HTTPClient, HTTPClientError, HTTPRequest
+from tornado.simple_httpclient import HTTPTimeoutError
+from tornado.websocket import websocket_connect
 
+import altair_viewer._viewer
+from altair_viewer import ChartViewer, resolve_bundled_version
+from altair_viewer._event_provider import encode_event
+from altair_viewer.tests.test_tracing import RecordingTracer
 
 CDN_URL = "https://cdn.jsdelivr.net/npm/"
 
@@ -27,8 +37,12 @@ class Mock:
 
 
 @pytest.fixture
-def http_client() -> HTTPClient:
-    return HTTPClient()
+def http_client() -> Iterator[HTTPClient]:
+    # Close the client's IOLoop here: if garbage collection closed it, that could
+    # happen on a server thread, racing with IOLoops created by the tests.
+    client = HTTPClient()
+    yield client
+    client.close()
 
 
 @pytest.fixture
@@ -62,14 +76,680 @@ def test_chart_viewer_resources(use_bundled_js: bool, viewers: Dict[bool, ChartV
             "vega-embed",
             "main",
             "favicon.ico",
+            "service-worker",
         }
     else:
         assert viewer._resources.keys() == {
             "main",
             "favicon.ico",
+            "service-worker",
         }
 
 
+def test_chart_viewer_versioned_script_urls(
+    viewers: Dict[bool, ChartViewer], http_client: HTTPClient
+):
+    viewer = viewers[True]
+    for package in ["vega", "vega-lite", "vega-embed"]:
+        version = resolve_bundled_version(package, viewer._versions[package])
+        url = viewer._resources[package].url
+        assert url.endswith(f"/scripts/{package}-{version}.js")
+        response = http_client.fetch(url)
+        assert "immutable" in response.headers["cache-control"]
+
+
+@pytest.mark.parametrize("use_bundled_js", [True, False])
+def test_chart_viewer_combine_scripts(
+    use_bundled_js: bool, chart: alt.Chart, http_client: HTTPClient
+):
+    viewer = ChartViewer(use_bundled_js=use_bundled_js, combine_scripts=True)
+    try:
+        html = http_client.fetch(viewer.url).body.decode()
+        script_urls = re.findall(r'<script src="([^"]+)"></script>', html)
+        assert script_urls == viewer._script_urls()
+        assert len(script_urls) == 1
+        assert json.dumps(script_urls) in viewer._inline_html(chart)
+        if use_bundled_js:
+            assert "/scripts/vendor-" in script_urls[0]
+            bundle = http_client.fetch(script_urls[0]).body.decode()
+            assert bundle.startswith(viewer._resources["vega"].content)
+            assert bundle.endswith(viewer._resources["vega-embed"].content)
+        else:
+            assert script_urls[0].startswith(CDN_URL.replace("npm/", "combine/"))
+    finally:
+        viewer.stop()
+
+
+def test_inline_mode_server(chart: alt.Chart, http_client: HTTPClient):
+    viewer = ChartViewer(inline_mode="server")
+    try:
+        viewer._initialize()
+        embed_opt = {"renderer": "svg"}
+        html = viewer._inline_html(chart, embed_opt)
+        assert json.dumps(chart.to_dict()) not in html
+        assert viewer._inline_html(chart, embed_opt) != html  # unique output div
+
+        loader_url = viewer._resources["inline-loader"].url
+        assert loader_url in html
+        loader = http_client.fetch(loader_url)
+        assert loader.headers["access-control-allow-origin"] == "*"
+        for url in viewer._script_urls():
+            assert url in loader.body.decode()
+
+        spec_url = re.search(r'"([^"]+/charts/[0-9a-f]+\.json)"', html)
+        assert spec_url is not None
+        response = http_client.fetch(spec_url.group(1))
+        assert response.headers["access-control-allow-origin"] == "*"
+        assert json.loads(response.body) == {
+            "spec": chart.to_dict(),
+            "embedOpt": embed_opt,
+        }
+    finally:
+        viewer.stop()
+
+
+def test_inline_mode_server_restart(chart: alt.Chart, http_client: HTTPClient):
+    viewer = ChartViewer(inline_mode="server")
+    try:
+        viewer._initialize()
+        viewer._inline_html(chart)
+        viewer.stop()
+        viewer._initialize()
+        html = viewer._inline_html(chart)
+        loader_url = viewer._resources["inline-loader"].url
+        assert loader_url in html
+        assert http_client.fetch(loader_url).code == 200
+    finally:
+        viewer.stop()
+
+
+def test_render_mode_worker(chart: alt.Chart, http_client: HTTPClient):
+    viewer = ChartViewer(render_mode="worker")
+    try:
+        html = http_client.fetch(viewer.url).body.decode()
+        assert 'const renderMode = "worker";' in html
+        assert "<script src=" not in html
+        worker_url = viewer._resources["render-worker"].url
+        assert f'new Worker("{worker_url}")' in html
+        worker = http_client.fetch(worker_url).body.decode()
+        imports = re.search(r"importScripts\((.*)\);", worker)
+        assert imports is not None
+        assert json.loads(f"[{imports.group(1)}]") == [
+            viewer._package_url("vega"),
+            viewer._package_url("vega-lite"),
+        ]
+    finally:
+        viewer.stop()
+
+
+def _unused_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.mark.parametrize("render_mode", ["main", "worker"])
+def test_service_worker(http_client: HTTPClient, render_mode: str):
+    port = _unused_port()
+    viewer = ChartViewer(port=port, service_worker=True, render_mode=render_mode)
+    try:
+        assert viewer.url == f"http://localhost:{port}/"
+        html = http_client.fetch(viewer.url).body.decode()
+        assert "const serviceWorkerEnabled = true;" in html
+        response = http_client.fetch(f"http://localhost:{port}/service-worker.js")
+        assert response.headers["cache-control"] == "no-cache"
+        worker = response.body.decode()
+        precache = re.search(r"new Set\(\[(.*)\]\.map", worker)
+        assert precache is not None
+        urls = json.loads(f"[{precache.group(1)}]")
+        assert urls[0] == viewer.url
+        assert viewer._resources["favicon.ico"].url in urls
+        if render_mode == "main":
+            assert set(viewer._script_urls()) < set(urls)
+        else:
+            assert viewer._resources["render-worker"].url in urls
+            assert viewer._package_url("vega-lite") in urls
+    finally:
+        viewer.stop()
+
+
+def test_service_worker_cache_name():
+    def cache_name(**kwds: Any) -> str:
+        viewer = ChartViewer(port=_unused_port(), service_worker=True, **kwds)
+        try:
+            viewer._initialize()
+            content = viewer._resources["service-worker"].content
+        finally:
+            viewer.stop()
+        match = re.search(r'const CACHE = "(altair-viewer-[0-9a-f]+)";', content)
+        assert match is not None
+        return match.group(1)
+
+    assert cache_name() != cache_name(history_size=2)
+
+
+def test_service_worker_disabled(http_client: HTTPClient):
+    viewer = ChartViewer(port=_unused_port())
+    try:
+        html = http_client.fetch(viewer.url).body.decode()
+        assert "const serviceWorkerEnabled = false;" in html
+        # Workers registered by earlier viewers on this port remove themselves.
+        worker = http_client.fetch(viewer.url + "service-worker.js").body.decode()
+        assert "self.registration.unregister()" in worker
+    finally:
+        viewer.stop()
+
+
+def test_port_in_use():
+    with socket.socket() as sock:
+        sock.bind(("", 0))
+        sock.listen()
+        port = sock.getsockname()[1]
+        viewer = ChartViewer(port=port, service_worker=True)
+        try:
+            with pytest.warns(UserWarning, match=f"Port {port} is in use"):
+                viewer._initialize()
+            assert viewer._provider is not None
+            assert viewer._provider.port != port
+            assert "unregister" in viewer._resources["service-worker"].content
+            assert "const serviceWorkerEnabled = false;" in (
+                viewer._resources["main"].content
+            )
+        finally:
+            viewer.stop()
+
+
+def test_service_worker_error():
+    with pytest.raises(ValueError) as err:
+        ChartViewer(service_worker=True)
+    assert str(err.value) == "service_worker=True requires a port"
+
+
+def test_display_canvas_threshold(monkeypatch):
+    chart = alt.Chart(alt.Data(values=[{"x": i} for i in range(10)])).mark_point()
+    viewer = ChartViewer(canvas_threshold=5)
+    try:
+        viewer._initialize()
+        stream_send = Mock()
+        monkeypatch.setattr(viewer._stream, "send", stream_send)
+        viewer.display(chart, open_browser=False)
+        viewer.display(chart, embed_opt={"renderer": "svg"}, open_browser=False)
+        embed_opts = [json.loads(args[0])["embedOpt"] for args, _ in stream_send.calls]
+        assert embed_opts == [{"renderer": "canvas"}, {"renderer": "svg"}]
+        assert '{"renderer": "canvas"}' in viewer._inline_html(chart)
+    finally:
+        viewer.stop()
+
+
+def test_display_externalize_data(monkeypatch, http_client: HTTPClient):
+    monkeypatch.setattr(webbrowser, "open", Mock())
+    values = [{"x": i} for i in range(100)]
+    viewer = ChartViewer(externalize_threshold=100, resource_budget=0)
+    try:
+        urls = []
+        for mark in ["point", "line"]:
+            chart = alt.Chart(alt.Data(values=values)).mark_point(color=mark)
+            viewer.display(chart, open_browser=False)
+            assert viewer._stream is not None
+            spec = json.loads(viewer._stream.data)["spec"]
+            assert "datasets" not in spec
+            urls.append(spec["data"]["url"])
+            response = http_client.fetch(urls[-1])
+            assert json.loads(response.body) == values
+            assert "immutable" in response.headers["cache-control"]
+        # Identical data is served from the same resource.
+        assert urls[0] == urls[1]
+
+        viewer.display(alt.Chart("data.csv").mark_point(), open_browser=False)
+        assert viewer._pool.nbytes == 0
+        gc.collect()
+        with pytest.raises(HTTPClientError) as err:
+            http_client.fetch(urls[0])
+        assert err.value.code == 404
+    finally:
+        viewer.stop()
+
+
+def test_display_externalize_data_restart(monkeypatch, http_client: HTTPClient):
+    monkeypatch.setattr(webbrowser, "open", Mock())
+    chart = alt.Chart(alt.Data(values=[{"x": i} for i in range(100)])).mark_point()
+    viewer = ChartViewer(externalize_threshold=100)
+    try:
+        viewer.display(chart, open_browser=False)
+        viewer.stop()
+        viewer.display(chart, open_browser=False)
+        assert viewer._stream is not None
+        url = json.loads(viewer._stream.data)["spec"]["data"]["url"]
+        assert len(json.loads(http_client.fetch(url).body)) == 100
+    finally:
+        viewer.stop()
+
+
+def test_display_compressed(monkeypatch, http_client: HTTPClient):
+    monkeypatch.setattr(webbrowser, "open", Mock())
+    chart = alt.Chart(alt.Data(values=[{"x": i} for i in range(1000)])).mark_point()
+    viewer = ChartViewer(compression_level=6, compression_min_size=100)
+    try:
+        viewer.display(chart, open_browser=False)
+        assert viewer._stream is not None
+        headers: List[str] = []
+        body: List[bytes] = []
+        request = HTTPRequest(
+            url=viewer._stream.url,
+            headers={"Accept-Encoding": "gzip"},
+            decompress_response=False,
+            header_callback=lambda line: headers.append(line.lower()),
+            streaming_callback=body.append,
+            request_timeout=0.5,
+        )
+        with pytest.raises(HTTPTimeoutError):
+            http_client.fetch(request)
+    finally:
+        viewer.stop()
+    assert "content-encoding: gzip\r\n" in headers
+    data = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(b"".join(body))
+    assert data == encode_event(viewer._stream.data)
+    assert len(b"".join(body)) < len(data)
+
+
+def test_display_server_compile(monkeypatch, chart: alt.Chart):
+    pytest.importorskip("vl_convert")
+    monkeypatch.setattr(webbrowser, "open", Mock())
+    viewer = ChartViewer(server_compile=True)
+    try:
+        viewer.display(chart, embed_opt={"config": {"background": "red"}})
+        assert viewer._stream is not None
+        data = json.loads(viewer._stream.data)
+        assert data["embedOpt"] == {"mode": "vega"}
+        assert data["spec"]["background"] == "red"
+        assert "marks" in data["spec"]
+    finally:
+        viewer.stop()
+
+
+def test_server_compile_unavailable(monkeypatch):
+    monkeypatch.setattr(altair_viewer._viewer, "compiler_available", lambda: False)
+    with pytest.warns(UserWarning, match="vl-convert-python"):
+        viewer = ChartViewer(server_compile=True)
+    assert viewer._compile_cache is None
+
+
+def test_memory_usage(monkeypatch, chart: alt.Chart):
+    monkeypatch.setattr(webbrowser, "open", Mock())
+    viewer = ChartViewer(inline_mode="server", resource_budget=1000)
+    try:
+        assert viewer.memory_usage() == {}
+        viewer.display(chart, open_browser=False)
+        usage = viewer.memory_usage()
+        assert usage["stream/spec"] > len(json.dumps(chart.to_dict()))
+        for package in ["vega", "vega-lite", "vega-embed"]:
+            resource = viewer._resources[package]
+            assert usage[resource.guid] == len(resource.content.encode())
+
+        # Inline charts are released, oldest first, beyond the resource budget.
+        charts = [chart.properties(title="x" * 300 + str(i)) for i in range(5)]
+        html = [viewer._inline_html(c) for c in charts]
+        routes = [r for r in viewer.memory_usage() if r.startswith("charts/")]
+        assert 0 < len(routes) < len(charts)
+        assert all(route in html[-1] for route in routes)
+        assert viewer._pool.nbytes <= 1000
+    finally:
+        viewer.stop()
+
+
+def test_display_client_cache(monkeypatch, chart: alt.Chart, http_client: HTTPClient):
+    monkeypatch.setattr(webbrowser, "open", Mock())
+    viewer = ChartViewer()
+    try:
+        viewer.display(chart, open_browser=False)
+        assert viewer._stream is not None and viewer._provider is not None
+        first = json.loads(viewer._stream.data)
+        assert first["spec"] == chart.to_dict()
+
+        cached = {first["hash"]}
+        monkeypatch.setattr(viewer._provider, "cached_by_clients", cached.__contains__)
+        viewer.display(chart, embed_opt={"renderer": "svg"}, open_browser=False)
+        second = json.loads(viewer._stream.data)
+        assert second.keys() == {"hash", "url", "embedOpt"}
+        assert second["hash"] == first["hash"]
+        assert second["embedOpt"] == {"renderer": "svg"}
+        assert json.loads(http_client.fetch(second["url"]).body) == first["spec"]
+
+        viewer.display(chart.mark_line(), open_browser=False)
+        assert "spec" in json.loads(viewer._stream.data)
+    finally:
+        viewer.stop()
+
+
+@pytest.mark.parametrize(
+    "kwds",
+    [{"client_cache_size": 0}, {"history_size": 2}, {"render_mode": "worker"}],
+)
+def test_display_client_cache_disabled(monkeypatch, chart: alt.Chart, kwds):
+    monkeypatch.setattr(webbrowser, "open", Mock())
+    viewer = ChartViewer(**kwds)
+    try:
+        viewer._initialize()
+        assert viewer._provider is not None
+        monkeypatch.setattr(viewer._provider, "cached_by_clients", lambda key: True)
+        viewer.display(chart, open_browser=False)
+        assert viewer._stream is not None
+        assert json.loads(viewer._stream.data).keys() == {"spec", "embedOpt"}
+    finally:
+        viewer.stop()
+
+
+def test_display_progressive(monkeypatch, http_client: HTTPClient):
+    monkeypatch.setattr(webbrowser, "open", Mock())
+    monkeypatch.setattr(altair_viewer._viewer, "CHUNK_ROWS", 30)
+    values = [{"x": i} for i in range(100)]
+    chart = {"datasets": {"d": values}, "data": {"name": "d"}, "mark": "point"}
+    viewer = ChartViewer(progressive_rows=10)
+    try:
+        viewer.display(chart, open_browser=False)
+        assert viewer._stream is not None and viewer._progress is not None
+        data = json.loads(viewer._stream.data)
+        sample = data["spec"]["datasets"]["d"]
+        assert len(sample) == 10
+        assert data["progressive"] == 1
+
+        for _ in range(100):
+            manifest = json.loads(viewer._progress.data or "{}")
+            if manifest.get("complete"):
+                break
+            time.sleep(0.05)
+        assert manifest["id"] == 1
+        assert len(manifest["chunks"]) == 3
+        rows = list(sample)
+        for chunk in manifest["chunks"]:
+            assert chunk["dataset"] == "d"
+            rows += json.loads(http_client.fetch(chunk["url"]).body)
+        assert sorted(rows, key=lambda row: row["x"]) == values
+
+        html = http_client.fetch(viewer.url).body.decode()
+        assert "const progressiveEnabled = true;" in html
+    finally:
+        viewer.stop()
+
+
+def test_display_progressive_externalized(monkeypatch):
+    vl_convert = pytest.importorskip("vl_convert")
+    monkeypatch.setattr(webbrowser, "open", Mock())
+    values = [{"x": i, "label": f"row-{i}"} for i in range(10_000)]
+    chart = {
+        "datasets": {"data-abc": values},
+        "data": {"name": "data-abc"},
+        "mark": "point",
+        "encoding": {"x": {"field": "x", "type": "quantitative"}},
+    }
+    viewer = ChartViewer(progressive_rows=5000)
+    try:
+        viewer.display(chart, open_browser=False)
+        assert viewer._stream is not None
+        spec = json.loads(viewer._stream.data)["spec"]
+    finally:
+        viewer.stop()
+    # The sample is larger than externalize_threshold, but is not externalized.
+    assert len(json.dumps(spec["datasets"]["data-abc"])) > 100_000
+    vega = vl_convert.vegalite_to_vega(spec)
+    if isinstance(vega, str):
+        vega = json.loads(vega)
+    assert "data-abc" in [data["name"] for data in vega["data"]]
+
+
+def test_progressive_worker_error():
+    with pytest.raises(ValueError):
+        ChartViewer(progressive_rows=10, render_mode="worker")
+
+
+def test_on_signal():
+    viewer = ChartViewer()
+    calls = []
+    done = threading.Event()
+
+    def callback(name, value):
+        calls.append((name, value, threading.current_thread().name))
+        done.set()
+
+    try:
+        viewer.on_signal("brush", callback, throttle_ms=50)
+        viewer.on_signal("brush", callback)
+        assert viewer._provider is not None
+        url = viewer._provider.url.replace("http://", "ws://") + "/websocket"
+
+        async def check():
+            conn = await websocket_connect(url)
+            assert json.loads(await conn.read_message()) == {"signals": {"brush": 50}}
+            conn.write_message(json.dumps({"signals": {"brush": {"x": [1, 2]}}}))
+            await asyncio.get_running_loop().run_in_executor(None, done.wait, 5)
+            conn.close()
+
+        asyncio.run(check())
+    finally:
+        viewer.stop()
+    assert [call[:2] for call in calls] == [("brush", {"x": [1, 2]})] * 2
+    assert calls[0][2].startswith("altair_viewer-signals")
+
+
+def test_on_signal_coalesced(caplog):
+    viewer = ChartViewer()
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def callback(name, value):
+        calls.append((name, value))
+        started.set()
+        release.wait(5)
+        if value == 3:
+            raise ValueError("callback error")
+
+    try:
+        viewer.on_signal("a", callback)
+        viewer.on_signal("b", callback)
+        viewer._receive_signals({"a": 1})
+        assert started.wait(5)
+        # Signals which change while callbacks are busy are coalesced.
+        viewer._receive_signals({"a": 2, "b": 1})
+        viewer._receive_signals({"a": 3, "unknown": 0})
+        release.set()
+        for _ in range(500):
+            if not viewer._dispatching_signals:
+                break
+            time.sleep(0.01)
+    finally:
+        viewer.stop()
+    assert calls == [("a", 1), ("a", 3), ("b", 1)]
+    assert "Error in callback for signal 'a'" in caplog.text
+
+
+def test_on_signal_worker_error():
+    with pytest.raises(ValueError):
+        ChartViewer(render_mode="worker").on_signal("brush", print)
+
+
+def test_chart_viewer_history(monkeypatch, chart: alt.Chart, http_client: HTTPClient):
+    monkeypatch.setattr(webbrowser, "open", Mock())
+    viewer = ChartViewer(history_size=2)
+    try:
+        for mark in ["point", "line", "bar"]:
+            viewer.display(getattr(chart, f"mark_{mark}")(), open_browser=False)
+        html = http_client.fetch(viewer.url).body.decode()
+        assert "const historyEnabled = true;" in html
+        history_url = f"{viewer.url}history/spec"
+        entries = json.loads(http_client.fetch(history_url).body)
+        assert [e["id"] for e in entries] == [1, 2]
+        data = json.loads(http_client.fetch(f"{history_url}/2").body)
+        assert data["spec"]["mark"] == {"type": "bar"}
+    finally:
+        viewer.stop()
+
+
+def test_display_background_workers(monkeypatch, chart: alt.Chart):
+    viewer = ChartViewer(background_workers=1)
+    try:
+        viewer._initialize()
+        assert viewer._stream is not None
+        converting = threading.Event()
+        release = threading.Event()
+        sent = []
+
+        # Hold the first chart in conversion while the others are displayed.
+        point = chart.mark_point()
+        to_dict = alt.Chart.to_dict
+
+        def blocking_to_dict(self: alt.Chart, *args: Any, **kwargs: Any) -> dict:
+            if self is point:
+                converting.set()
+                release.wait(timeout=5)
+            return to_dict(self, *args, **kwargs)
+
+        monkeypatch.setattr(alt.Chart, "to_dict", blocking_to_dict)
+        monkeypatch.setattr(
+            viewer._stream,
+            "send",
+            lambda data, *args: sent.append(json.loads(data)["spec"]["mark"]),
+        )
+        displayed = [viewer.display(point, open_browser=False)]
+        assert converting.wait(timeout=5)
+        displayed += [
+            viewer.display(getattr(chart, f"mark_{mark}")(), open_browser=False)
+            for mark in ["line", "bar"]
+        ]
+        assert all(d is not None for d in displayed)
+        assert not displayed[0].done()  # type: ignore[union-attr]
+        release.set()
+        for d in displayed:
+            d.result(timeout=5)  # type: ignore[union-attr]
+        # The intermediate chart is superseded before it is converted.
+        assert sent == [{"type": "point"}, {"type": "bar"}]
+    finally:
+        viewer.stop()
+
+
+def test_display_traced(chart: alt.Chart):
+    tracer = RecordingTracer()
+    viewer = ChartViewer(background_workers=1, tracer=tracer)
+    try:
+        displayed = viewer.display(chart, open_browser=False)
+        assert displayed is not None
+        displayed.result(timeout=5)
+        assert viewer._stream is not None and viewer._provider is not None
+        assert json.loads(viewer._stream.data)["id"] == 1
+        url = viewer._provider.url.replace("http://", "ws://") + "/websocket"
+
+        async def check():
+            conn = await websocket_connect(url)
+            conn.write_message(json.dumps({"rendered": {"id": 1, "duration_ms": 25}}))
+            for _ in range(200):
+                if tracer.spans[-1][0] == "render":
+                    break
+                await asyncio.sleep(0.005)
+            conn.close()
+
+        asyncio.run(check())
+    finally:
+        viewer.stop()
+    names = [name for name, _, _, _ in tracer.spans]
+    assert names == ["queue", "convert", "serialize", "publish", "render"]
+    for name, start_ns, end_ns, attributes in tracer.spans:
+        assert attributes["display"] == 1
+        assert start_ns <= end_ns
+    _, start_ns, end_ns, _ = tracer.spans[-1]
+    assert end_ns - start_ns == 25_000_000
+
+
+@pytest.mark.parametrize(
+    "n_rows,embed_opt,expected",
+    [
+        (20, None, {"marks": 20, "renderer": "default"}),
+        (20, {"renderer": "svg"}, {"renderer": "svg"}),
+        (200, None, {"marks": 200, "renderer": "canvas"}),
+    ],
+)
+def test_display_traced_renderer(monkeypatch, n_rows, embed_opt, expected):
+    monkeypatch.setattr(webbrowser, "open", Mock())
+    tracer = RecordingTracer()
+    chart = alt.Chart(alt.Data(values=[{"x": i} for i in range(n_rows)])).mark_point()
+    viewer = ChartViewer(canvas_threshold=100, tracer=tracer)
+    try:
+        viewer.display(chart, embed_opt=embed_opt, open_browser=False)
+    finally:
+        viewer.stop()
+    [attributes] = [attrs for name, _, _, attrs in tracer.spans if name == "convert"]
+    assert attributes == dict(expected, display=1)
+
+
+def test_display_background_error():
+    viewer = ChartViewer(background_workers=1)
+    try:
+        displayed = viewer.display(alt.Chart("data.csv"), open_browser=False)
+        assert displayed is not None
+        with pytest.raises(alt.utils.schemapi.SchemaValidationError):
+            displayed.result(timeout=5)
+    finally:
+        viewer.stop()
+
+
+@pytest.mark.parametrize("open_browser", [True, False])
+def test_prewarm(
+    monkeypatch, open_browser: bool, chart: alt.Chart, http_client: HTTPClient
+):
+    browser_open = Mock()
+    monkeypatch.setattr(webbrowser, "open", browser_open)
+    viewer = ChartViewer()
+    try:
+        viewer.prewarm(open_browser=open_browser).result(timeout=10)
+        assert viewer._provider is not None
+        html = http_client.fetch(viewer.url).body.decode()
+        assert "vega-lite" in html
+        assert browser_open.calls == ([((viewer.url,), {})] if open_browser else [])
+
+        # The page opened by prewarm() is used by the first displayed chart.
+        viewer.display(chart)
+        assert len(browser_open.calls) == 1
+    finally:
+        viewer.stop()
+
+
+def test_prewarm_error(monkeypatch):
+    monkeypatch.setattr(webbrowser, "open", Mock())
+    viewer = ChartViewer(vegalite_version="0.1")
+    try:
+        with pytest.raises(altair_viewer.NoMatchingVersions):
+            viewer.prewarm().result(timeout=10)
+    finally:
+        viewer.stop()
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("", None), ("0", None), ("1", False), ("open", True), ("OPEN", True)],
+)
+def test_prewarm_from_environment(monkeypatch, value: str, expected: Any):
+    monkeypatch.setenv("ALTAIR_VIEWER_PREWARM", value)
+    prewarm = Mock()
+    viewer = ChartViewer()
+    monkeypatch.setattr(viewer, "prewarm", prewarm)
+    altair_viewer._viewer._prewarm_from_environment(viewer)
+    if expected is None:
+        assert prewarm.calls == []
+    else:
+        assert prewarm.calls == [((), {"open_browser": expected})]
+
+
+def test_inline_mode_error():
+    with pytest.raises(ValueError) as err:
+        ChartViewer(inline_mode="stub")
+    assert str(err.value) == "inline_mode must be 'full' or 'server'; got 'stub'"
+
+
+def test_render_mode_error():
+    with pytest.raises(ValueError) as err:
+        ChartViewer(render_mode="gpu")
+    assert str(err.value) == "render_mode must be 'main' or 'worker'; got 'gpu'"
+
+
 @pytest.mark.parametrize("use_bundled_js", [True, False])
 def test_chart_viewer_main_url(use_bundled_js: bool, viewers: Dict[bool, ChartViewer]):
     viewer = viewers[use_bundled_js]
@@ -170,7 +850,13 @@ def test_show(
     assert viewer._use_bundled_js == use_bundled_js
 
     browser_open = Mock()
-    monkeypatch.setattr(webbrowser, "open", browser_open)
+    opened = threading.Event()
+
+    def open_url(url: str) -> None:
+        browser_open(url)
+        opened.set()
+
+    monkeypatch.setattr(webbrowser, "open", open_url)
 
     ipython_display = Mock()
     monkeypatch.setattr(display, "display", ipython_display)
@@ -193,6 +879,9 @@ def test_show(
 
     # Thread should stay alive until disconnect event.
     assert viewer_thread.is_alive()
+    # Opening the browser clears the disconnect event, so disconnect after it.
+    if open_browser:
+        assert opened.wait(timeout=5)
     viewer._provider._disconnect_event.set()
     viewer_thread.join()
     assert not viewer_thread.is_alive()
@@ -0,0 +1,270 @@
+"""Benchmarks for event stream throughput and latency.
+
+Clients are real HTTP connections to a local EventProvider, made with tornado's
+AsyncHTTPClient on a separate event loop.
+"""
+
+import asyncio
+import statistics
+import threading
+import time
+from typing import Dict, List
+
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+
+from altair_viewer._event_provider import EventProvider
+
+
+class _Subscriber:
+    """An event stream client which records the arrival time of each event."""
+
+    def __init__(self) -> None:
+        self.chunks: List[bytes] = []
+        self.events: List[bytes] = []
+        self.arrivals: List[float] = []
+        self.changed = asyncio.Event()
+
+    def __call__(self, chunk: bytes) -> None:
+        # Only join the received chunks once an event is complete, so that large
+        # events arriving in many chunks are not copied repeatedly.
+        tail = self.chunks[-1][-1:] if self.chunks else b""
+        self.chunks.append(chunk)
+        if b"\n\n" in tail + chunk:
+            *events, rest = b"".join(self.chunks).split(b"\n\n")
+            self.chunks = [rest] if rest else []
+            now = time.perf_counter()
+            self.events.extend(events)
+            self.arrivals.extend(now for _ in events)
+        self.changed.set()
+
+    async def wait_for(self, count: int) -> None:
+        while len(self.events) < count:
+            self.changed.clear()
+            await self.changed.wait()
+
+
+async def _subscribe(url: str, n_clients: int) -> List[_Subscriber]:
+    """Connect n_clients to the stream and wait for the initial event.
+
+    The connections stay open until the running event loop is closed.
+    """
+    client = AsyncHTTPClient(force_instance=True, max_clients=n_clients)
+    subscribers = [_Subscriber() for _ in range(n_clients)]
+    for subscriber in subscribers:
+        request = HTTPRequest(url, streaming_callback=subscriber, request_timeout=3600)
+        future = client.fetch(request, raise_error=False)
+        # Streams never complete; they fail with "connection closed" on shutdown.
+        future.add_done_callback(lambda f: f.exception())
+    await asyncio.gather(*(s.wait_for(1) for s in subscribers))
+    return subscribers
+
+
+def fan_out_time(provider: EventProvider, n_clients: int, payload: str) -> float:
+    """Time from send() until every one of n_clients has received the event."""
+    stream = provider.create_stream(f"fan-out-{n_clients}-{len(payload)}")
+    stream.send("ready")
+
+    async def run() -> float:
+        subscribers = await _subscribe(stream.url, n_clients)
+        start = time.perf_counter()
+        stream.send(payload)
+        await asyncio.gather(*(s.wait_for(2) for s in subscribers))
+        return max(s.arrivals[1] for s in subscribers) - start
+
+    return asyncio.run(run())
+
+
+def update_latencies(provider: EventProvider, n_updates: int) -> List[float]:
+    """Latencies (in seconds) of a sequence of updates to a single client."""
+    stream = provider.create_stream("latency")
+    stream.send("update-0")
+
+    async def run() -> List[float]:
+        (subscriber,) = await _subscribe(stream.url, 1)
+        latencies = []
+        for i in range(1, n_updates + 1):
+            start = time.perf_counter()
+            stream.send(f"update-{i}")
+            await subscriber.wait_for(i + 1)
+            latencies.append(subscriber.arrivals[i] - start)
+        return latencies
+
+    return asyncio.run(run())
+
+
+def loaded_update_time(provider: EventProvider, n_clients: int, payload: str) -> float:
+    """Time to deliver a small event while a large one is sent to n_clients.
+
+    The large event is received on a separate thread and event loop, as by other
+    browsers, so that reading it does not delay the small event's client.
+    """
+    large = provider.create_stream(f"large-{n_clients}-{len(payload)}")
+    small = provider.create_stream(f"small-{n_clients}-{len(payload)}")
+    large.send("ready")
+    small.send("ready")
+    subscribed = threading.Event()
+    done = threading.Event()
+
+    async def receive_large() -> None:
+        await _subscribe(large.url, n_clients)
+        subscribed.set()
+        while not done.is_set():
+            await asyncio.sleep(0.01)
+
+    thread = threading.Thread(target=asyncio.run, args=(receive_large(),))
+    thread.start()
+
+    async def run() -> float:
+        (subscriber,) = await _subscribe(small.url, 1)
+        subscribed.wait()
+        large.send(payload)
+        start = time.perf_counter()
+        small.send("update")
+        await subscriber.wait_for(2)
+        return subscriber.arrivals[1] - start
+
+    try:
+        return asyncio.run(run())
+    finally:
+        done.set()
+        thread.join()
+
+
+def _staleness(subscriber: _Subscriber, sent: List[float]) -> List[float]:
+    """Time from sending each numbered update until it, or a newer one, arrived."""
+    received = [int(event[len(b"data: ") :]) for event in subscriber.events]
+    result = []
+    k = 0
+    for j, start in enumerate(sent):
+        while received[k] < j:
+            k += 1
+        result.append(subscriber.arrivals[k] - start)
+    return result
+
+
+def producer_latencies(
+    provider: EventProvider, n_producers: int, n_updates: int, interval: float
+) -> List[float]:
+    """Latencies (in seconds) of updates sent by concurrent producer threads.
+
+    Each producer thread sends n_updates updates to its own stream, one every
+    interval seconds. The latency of an update is the time until its client has
+    received it or a newer update, since a lagging client skips to the latest.
+    """
+    streams = [
+        provider.create_stream(f"producer-{n_producers}-{i}")
+        for i in range(n_producers)
+    ]
+    for stream in streams:
+        stream.send("-1")
+    sent = [[0.0] * n_updates for _ in streams]
+
+    def produce(i: int) -> None:
+        for j in range(n_updates):
+            sent[i][j] = time.perf_counter()
+            streams[i].send(str(j))
+            time.sleep(interval)
+
+    async def run() -> List[float]:
+        subscribers = [(await _subscribe(s.url, 1))[0] for s in streams]
+        threads = [
+            threading.Thread(target=produce, args=(i,)) for i in range(n_producers)
+        ]
+        for thread in threads:
+            thread.start()
+        final = f"data: {n_updates - 1}".encode()
+        while any(s.events[-1] != final for s in subscribers):
+            await asyncio.sleep(0.01)
+        for thread in threads:
+            thread.join()
+        return [
+            latency
+            for subscriber, times in zip(subscribers, sent)
+            for latency in _staleness(subscriber, times)
+        ]
+
+    return asyncio.run(run())
+
+
+class TrackFanOut:
+    params = ([1, 10, 50], [1_000, 1_000_000])
+    param_names = ["n_clients", "payload_size"]
+
+    def setup(self, n_clients: int, payload_size: int) -> None:
+        self.provider = EventProvider()
+        self.provider.start()
+        self.payload = "x" * payload_size
+
+    def teardown(self, n_clients: int, payload_size: int) -> None:
+        self.provider.stop()
+
+    def track_fan_out(self, n_clients: int, payload_size: int) -> float:
+        return 1000 * fan_out_time(self.provider, n_clients, self.payload)
+
+    track_fan_out.unit = "ms"  # type: ignore[attr-defined]
+
+
+class TrackLoadedUpdate:
+    params = ([1, 10], [10_000_000])
+    param_names = ["n_clients", "payload_size"]
+
+    def setup(self, n_clients: int, payload_size: int) -> None:
+        self.provider = EventProvider()
+        self.provider.start()
+        self.payload = "x" * payload_size
+
+    def teardown(self, n_clients: int, payload_size: int) -> None:
+        self.provider.stop()
+
+    def track_loaded_update(self, n_clients: int, payload_size: int) -> float:
+        return 1000 * loaded_update_time(self.provider, n_clients, self.payload)
+
+    track_loaded_update.unit = "ms"  # type: ignore[attr-defined]
+
+
+class TrackUpdateLatency:
+    timeout = 120
+
+    def setup_cache(self) -> Dict[str, float]:
+        provider = EventProvider()
+        provider.start()
+        try:
+            latencies = update_latencies(provider, 100)
+        finally:
+            provider.stop()
+        p50, p90, p99 = (
+            statistics.quantiles(latencies, n=100)[i - 1] for i in (50, 90, 99)
+        )
+        return {"p50": 1000 * p50, "p90": 1000 * p90, "p99": 1000 * p99}
+
+    def track_latency_p50(self, latencies: Dict[str, float]) -> float:
+        return latencies["p50"]
+
+    def track_latency_p90(self, latencies: Dict[str, float]) -> float:
+        return latencies["p90"]
+
+    def track_latency_p99(self, latencies: Dict[str, float]) -> float:
+        return latencies["p99"]
+
+    track_latency_p50.unit = "ms"  # type: ignore[attr-defined]
+    track_latency_p90.unit = "ms"  # type: ignore[attr-defined]
+    track_latency_p99.unit = "ms"  # type: ignore[attr-defined]
+
+
+class TrackProducerLatency:
+    params = [1, 8, 32]
+    param_names = ["n_producers"]
+    timeout = 120
+
+    def setup(self, n_producers: int) -> None:
+        self.provider = EventProvider()
+        self.provider.start()
+
+    def teardown(self, n_producers: int) -> None:
+        self.provider.stop()
+
+    def track_producer_latency_p50(self, n_producers: int) -> float:
+        latencies = producer_latencies(self.provider, n_producers, 100, 0.005)
+        return 1000 * statistics.median(latencies)
+
+    track_producer_latency_p50.unit = "ms"  # type: ignore[attr-defined]
@@ -0,0 +1,28 @@
+"""Benchmarks for version parsing and matching.
+
+These run for every bundled package each time a ChartViewer is initialized.
+Run with ``asv run`` or ``asv dev``; see https://asv.readthedocs.io/.
+"""
+
+from altair_viewer._scripts import _script_listing
+from altair_viewer._utils import Version, find_version
+
+
+class TimeVersion:
+    def setup(self):
+        self.candidates = _script_listing()["vega-lite"]
+
+    def time_parse(self):
+        Version("5.8.0")
+
+    def time_compare_str(self):
+        Version("5.8.0") < "5.10.0"
+
+    def time_sort_candidates(self):
+        sorted(map(Version, self.candidates))
+
+    def time_find_version(self):
+        find_version("5.8.0", self.candidates)
+
+    def time_find_version_none(self):
+        find_version(None, self.candidates)
@@ -0,0 +1,114 @@
+"""Benchmarks for ChartViewer startup, display cost and memory use."""
+
+import os
+
+import altair as alt
+import psutil
+
+from altair_viewer import ChartViewer, _scripts, _utils
+
+
+def make_spec(n_rows: int) -> dict:
+    """A Vega-Lite spec with n_rows of inline data."""
+    return {
+        "$schema": "https://vega.github.io/schema/vega-lite/v5.json",
+        "data": {
+            "values": [{"x": i, "y": i % 17, "c": f"c{i % 5}"} for i in range(n_rows)]
+        },
+        "mark": "point",
+        "encoding": {
+            "x": {"field": "x", "type": "quantitative"},
+            "y": {"field": "y", "type": "quantitative"},
+            "color": {"field": "c", "type": "nominal"},
+        },
+    }
+
+
+def make_chart(n_rows: int) -> alt.Chart:
+    """An Altair chart equivalent to make_spec(n_rows).
+
+    The chart is built directly, since ``alt.Chart.from_dict`` takes minutes to
+    convert thousands of rows.
+    """
+    values = make_spec(n_rows)["data"]["values"]
+    return (
+        alt.Chart(alt.Data(values=values))
+        .mark_point()
+        .encode(x="x:Q", y="y:Q", color="c:N")
+    )
+
+
+def _clear_caches() -> None:
+    _scripts._clear_caches()
+    _scripts._bundled_listing.cache_clear()
+    _scripts._combined_script.cache_clear()
+    _utils._find_version.cache_clear()
+    _utils._interned_version.cache_clear()
+
+
+class TimeImport:
+    def timeraw_import(self) -> str:
+        return "import altair_viewer"
+
+
+class TimeInitialize:
+    params = [False, True]
+    param_names = ["warm"]
+    number = 1
+    repeat = 10
+    warmup_time = 0
+
+    def setup(self, warm: bool) -> None:
+        # A viewer initialized first warms the caches, and is stopped in teardown.
+        self.warm_viewer = ChartViewer()
+        if warm:
+            self.warm_viewer._initialize()
+        else:
+            _clear_caches()
+        self.viewer = ChartViewer()
+
+    def teardown(self, warm: bool) -> None:
+        self.viewer.stop()
+        self.warm_viewer.stop()
+
+    def time_initialize(self, warm: bool) -> None:
+        self.viewer._initialize()
+
+
+class TimeDisplay:
+    params = ([10, 1_000, 10_000], ["dict", "chart"])
+    param_names = ["n_rows", "kind"]
+
+    def setup(self, n_rows: int, kind: str) -> None:
+        self.viewer = ChartViewer()
+        self.viewer._initialize()
+        self.chart = make_spec(n_rows) if kind == "dict" else make_chart(n_rows)
+
+    def teardown(self, n_rows: int, kind: str) -> None:
+        self.viewer.stop()
+
+    def time_display(self, n_rows: int, kind: str) -> None:
+        self.viewer.display(self.chart, open_browser=False)
+
+
+class TrackMemory:
+    timeout = 300
+
+    def setup(self) -> None:
+        self.viewer = ChartViewer()
+        self.viewer._initialize()
+
+    def teardown(self) -> None:
+        self.viewer.stop()
+
+    def track_rss_growth(self) -> float:
+        """Growth of resident memory in MB over a long loop of displays."""
+        process = psutil.Process(os.getpid())
+        for i in range(20):
+            self.viewer.display(make_spec(1_000 + i), open_browser=False)
+        start = process.memory_info().rss
+        for i in range(500):
+            self.viewer.display(make_spec(1_000 + i), open_browser=False)
+        return (process.memory_info().rss - start) / 1e6
+
+    track_rss_growth.unit = "MB"  # type: ignore[attr-defined]
@@ -66,7 +66,7 @@ setup(
     url="http://github.com/altair-viz/altair_viewer/",
     download_url="http://github.com/altair-viz/altair_viewer/",
     license="BSD 3-clause",
-    packages=find_packages(),
+    packages=[p for p in find_packages() if p.split(".")[0] != "benchmarks"],
     include_package_data=True,
     install_requires=get_install_requirements("requirements.txt"),
     python_requires=">=3.7",